@@ -1,16 +1,57 @@
 from django.urls import include, path
-from rest_framework.routers import DefaultRouter
+from rest_framework.routers import DefaultRouter, SimpleRouter
 
-from orders.views import DailyStatsViewSet, OrderUploadStatsViewSet
+from orders import async_views
+from orders.views import (DailyStatsViewSet, OrderUploadStatsViewSet,
+                          OrderViewSet, metrics)
 
-router = DefaultRouter()
 
-router.register(r'orders', OrderUploadStatsViewSet,
-                basename='order-upload-stats')
+class ApiRouter(DefaultRouter):
+    """Роутер API с точками загрузки и статистики заказов в корне API.
+
+    OrderUploadStatsViewSet не имеет списка, а его маршруты лежат
+    под тем же префиксом orders/, что и OrderViewSet, поэтому в корень
+    API они добавляются отдельными ключами.
+    """
+
+    extra_root_routes = {
+        'orders-upload': 'order-upload-stats-upload-orders',
+        'orders-upload-stream': 'order-upload-stats-upload-orders-stream',
+        'orders-stats': 'order-upload-stats-user-stats',
+        'orders-stats-bulk': 'order-upload-stats-users-stats',
+    }
+
+    def get_api_root_view(self, api_urls=None):
+        api_root_dict = {
+            prefix: self.routes[0].name.format(basename=basename)
+            for prefix, viewset, basename in self.registry
+        }
+        api_root_dict.update(self.extra_root_routes)
+        return self.APIRootView.as_view(api_root_dict=api_root_dict)
+
+
+router = ApiRouter()
+
+router.register(r'orders', OrderViewSet, basename='orders')
 router.register(r'daily-stats', DailyStatsViewSet,
                 basename='daily-stats')
 
+# Загрузка и статистика заказов - отдельные маршруты под orders/,
+# подключаются раньше маршрутов OrderViewSet, чтобы orders/upload/
+# и orders/stats/ не совпадали с orders/<pk>/.
+upload_stats_router = SimpleRouter()
+upload_stats_router.register(r'orders', OrderUploadStatsViewSet,
+                             basename='order-upload-stats')
+
 
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
+    path('async/orders/stats/', async_views.user_stats,
+         name='async-user-stats'),
+    path('async/orders/upload/', async_views.upload_orders,
+         name='async-upload-orders'),
+    path('async/daily-stats/', async_views.daily_stats,
+         name='async-daily-stats'),
+    path('', include(upload_stats_router.urls)),
     path('', include(router.urls)),
 ]
@@ -47,6 +47,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'orders.middleware.RequestMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -81,6 +82,14 @@ DATABASES = {
     }
 }
 
+# Неключевые столбцы индекса order_created_at_idx (include) нужны только
+# на PostgreSQL, SQLite их не поддерживает и создает индекс без них.
+# Предупреждение models.W040 отключается только для SQLite, чтобы
+# на других СУБД оно оставалось для новых индексов.
+SILENCED_SYSTEM_CHECKS = []
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    SILENCED_SYSTEM_CHECKS.append('models.W040')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -115,6 +124,75 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Локально - память процесса, в продакшене - Redis:
+# CACHE_BACKEND='django.core.cache.backends.redis.RedisCache',
+# CACHE_LOCATION='redis://localhost:6379/1'.
+CACHES = {
+    'default': {
+        'BACKEND': getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': getenv('CACHE_LOCATION', 'orders'),
+    }
+}
+
+# Время жизни кэша статистики пользователя (секунды).
+ORDERS_STATS_CACHE_TIMEOUT = int(getenv('ORDERS_STATS_CACHE_TIMEOUT', '300'))
+
+# Максимальное число пользователей в одном запросе пакетной статистики.
+ORDERS_STATS_BULK_MAX_USERS = int(
+    getenv('ORDERS_STATS_BULK_MAX_USERS', '1000')
+)
+
+# Размер страницы ежедневной статистики по умолчанию и максимальный
+# (параметр page_size).
+ORDERS_DAILY_STATS_PAGE_SIZE = int(
+    getenv('ORDERS_DAILY_STATS_PAGE_SIZE', '30')
+)
+ORDERS_DAILY_STATS_MAX_PAGE_SIZE = int(
+    getenv('ORDERS_DAILY_STATS_MAX_PAGE_SIZE', '366')
+)
+
+# Наибольшее количество дней, пересчитываемых в одной транзакции
+# задачей refresh_daily_stats.
+ORDERS_DAILY_STATS_CHUNK_DAYS = int(
+    getenv('ORDERS_DAILY_STATS_CHUNK_DAYS', '31')
+)
+
+# Размер страницы списка заказов по умолчанию и максимальный.
+ORDERS_LIST_PAGE_SIZE = int(getenv('ORDERS_LIST_PAGE_SIZE', '100'))
+ORDERS_LIST_MAX_PAGE_SIZE = int(getenv('ORDERS_LIST_MAX_PAGE_SIZE', '1000'))
+
+# Количество заказов в пачке при выгрузке.
+ORDERS_EXPORT_CHUNK_SIZE = int(getenv('ORDERS_EXPORT_CHUNK_SIZE', '2000'))
+
+# Число строк таблицы, начиная с которого админка на PostgreSQL берет
+# оценку количества из статистики планировщика вместо COUNT(*).
+ORDERS_ADMIN_ESTIMATED_COUNT_THRESHOLD = int(
+    getenv('ORDERS_ADMIN_ESTIMATED_COUNT_THRESHOLD', '100000')
+)
+
+# Максимальная длина периода (дни) временного ряда заказов.
+ORDERS_STATS_SERIES_MAX_DAYS = int(
+    getenv('ORDERS_STATS_SERIES_MAX_DAYS', '366')
+)
+
+# Замер запросов к API: число и время SQL-запросов, время рендеринга
+# ответа и общее время (заголовок Server-Timing, журнал, /api/metrics/).
+ORDERS_METRICS_ENABLED = getenv('ORDERS_METRICS_ENABLED', 'True') == 'True'
+
+# Префикс путей, запросы к которым замеряются.
+ORDERS_METRICS_PATH_PREFIX = getenv('ORDERS_METRICS_PATH_PREFIX', '/api/')
+
+# Порог медленного запроса (мс): для него в журнал выводятся SQL-запросы.
+ORDERS_SLOW_REQUEST_MS = int(getenv('ORDERS_SLOW_REQUEST_MS', '1000'))
+
+# Максимальное число SQL-запросов, сохраняемых для журнала медленного
+# запроса.
+ORDERS_SLOW_REQUEST_MAX_QUERIES = int(
+    getenv('ORDERS_SLOW_REQUEST_MAX_QUERIES', '100')
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -125,6 +203,16 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # JSON через orjson (pip install orjson), без него - модулем json.
+    'DEFAULT_RENDERER_CLASSES': [
+        'orders.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'orders.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
@@ -147,6 +235,15 @@ SPECTACULAR_SETTINGS = {
     'SCHEMA_PATH_PREFIX': '/api/s'
 }
 
+# Уровень журнала orders: DEBUG, INFO, WARNING, ERROR.
+ORDERS_LOG_LEVEL = getenv('ORDERS_LOG_LEVEL', 'INFO')
+
+# Формат файла журнала orders: 'verbose' - текст, 'json' - JSON-строки.
+ORDERS_LOG_FORMAT = getenv('ORDERS_LOG_FORMAT', 'verbose')
+
+# Запись журнала orders в фоновом потоке через очередь (OrdersQueueHandler).
+ORDERS_LOG_QUEUE = getenv('ORDERS_LOG_QUEUE', 'True') == 'True'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -159,13 +256,16 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'orders.log.JsonFormatter',
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
             'class': 'logging.FileHandler',
             'filename': 'logs/orders.log',
-            'formatter': 'verbose',
+            'formatter': ORDERS_LOG_FORMAT,
         },
         'console': {
             'level': 'DEBUG',
@@ -176,22 +276,76 @@ LOGGING = {
     'loggers': {
         'orders': {
             'handlers': ['file', 'console'],
-            'level': 'INFO',
+            'level': ORDERS_LOG_LEVEL,
             'propagate': True,
         },
     },
 }
 
+if ORDERS_LOG_QUEUE:
+    LOGGING['handlers']['queue'] = {
+        '()': 'orders.log.OrdersQueueHandler',
+        'handlers': ['cfg://handlers.file', 'cfg://handlers.console'],
+    }
+    LOGGING['loggers']['orders']['handlers'] = ['queue']
+
+# Стратегия записи заказов при загрузке:
+# 'diff' - чтение существующих заказов, bulk_create + bulk_update;
+# 'upsert' - INSERT ... ON CONFLICT (order_number) DO UPDATE (загрузки
+# с пересекающимися номерами заказов не должны выполняться параллельно:
+# счетчики ответа и статистика пользователей могут разойтись до сверки).
+ORDERS_UPLOAD_STRATEGY = getenv('ORDERS_UPLOAD_STRATEGY', 'diff')
+
+# Размер пачки заказов (и batch_size для bulk-операций) при загрузке.
+ORDERS_UPLOAD_BATCH_SIZE = int(getenv('ORDERS_UPLOAD_BATCH_SIZE', '1000'))
+
+# Границы транзакции при загрузке: 'upload' - одна транзакция на всю
+# загрузку, 'chunk' - отдельная транзакция на каждую пачку заказов.
+# Строки DailyOrderStats затронутых дней блокируются до конца
+# транзакции: в режиме 'upload' параллельные загрузки заказов за один
+# день (обычно сегодняшний) выполняются по очереди, в режиме 'chunk'
+# блокировка держится только на время пачки.
+ORDERS_UPLOAD_TRANSACTION = getenv('ORDERS_UPLOAD_TRANSACTION', 'upload')
+
+# Валидация загрузки: 'serializer' - вложенные DRF-сериализаторы,
+# 'fast' - OrderPayloadValidator с теми же правилами и структурой ошибок.
+ORDERS_UPLOAD_VALIDATOR = getenv('ORDERS_UPLOAD_VALIDATOR', 'serializer')
+
+# Предельное время обработки задачи асинхронной загрузки (секунды):
+# мягкий лимит задачи Celery, жесткий - на минуту больше. Задача,
+# которая выполняется дольше жесткого лимита (например, воркер
+# остановлен), помечается как завершенная с ошибкой.
+ORDERS_UPLOAD_JOB_TIMEOUT = int(getenv('ORDERS_UPLOAD_JOB_TIMEOUT', '3600'))
+
+# Максимальное число ошибок строк в ответе потоковой загрузки (NDJSON).
+ORDERS_UPLOAD_STREAM_MAX_ERRORS = int(
+    getenv('ORDERS_UPLOAD_STREAM_MAX_ERRORS', '100')
+)
+
 CELERY_BROKER_URL = getenv('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = getenv('CELERY_RESULT_BACKEND')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Синхронное выполнение задач без брокера (для тестов и отладки).
+CELERY_TASK_ALWAYS_EAGER = getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
 
 CELERY_BEAT_SCHEDULE = {
     'daily-order-stats': {
         'task': 'orders.tasks.daily_order_stats',
         'schedule': crontab(hour=0, minute=0)
+    },
+    'refresh-daily-stats': {
+        'task': 'orders.tasks.refresh_daily_stats',
+        'schedule': crontab(minute='*/15')
+    },
+    'reconcile-user-stats': {
+        'task': 'orders.tasks.reconcile_user_stats',
+        'schedule': crontab(hour=0, minute=30)
+    },
+    'expire-upload-jobs': {
+        'task': 'orders.tasks.expire_upload_jobs',
+        'schedule': crontab(minute='*/15')
     }
 }
@@ -12,3 +12,18 @@ class OrderConstants:
     MAX_SKU_LENGTH = 50
     MAX_ORDER_ITEM_NAME = 255
     MAX_PRICE_DIGITS = 10
+    CONTENT_HASH_LENGTH = 32
+
+
+class UploadConstants:
+    """Класс режимов валидации, записи и транзакций загрузки заказов."""
+
+    STRATEGY_DIFF = 'diff'
+    STRATEGY_UPSERT = 'upsert'
+    STRATEGIES = (STRATEGY_DIFF, STRATEGY_UPSERT)
+
+    TRANSACTION_UPLOAD = 'upload'
+    TRANSACTION_CHUNK = 'chunk'
+
+    VALIDATOR_SERIALIZER = 'serializer'
+    VALIDATOR_FAST = 'fast'
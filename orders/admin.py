@@ -1,6 +1,43 @@
 from django.contrib import admin
-
-from .models import DailyOrderStats, Order, OrderItem, User
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import invalidate_user_stats
+from .models import (DailyOrderStats, DailyStatsDirtyDate, Order, OrderItem,
+                     OrderStatusRollup, RollupGrain, UploadJob, User,
+                     UserOrderStats)
+from .pagination import EstimatedCountPaginator
+from .stats import (OrderState, apply_user_stats_changes,
+                    mark_daily_stats_dirty)
+
+
+class OrderStatusListFilter(admin.SimpleListFilter):
+    """Фильтр заказов по статусу.
+
+    Варианты берутся из дневных интервалов статусов, а не DISTINCT
+    по всей таблице заказов. Интервалы пересчитываются задачами
+    Celery, поэтому к ним добавляются статусы последних
+    RECENT_ORDERS заказов: статусы из свежих загрузок видны сразу.
+    """
+
+    title = 'Статус заказа'
+    parameter_name = 'status'
+    RECENT_ORDERS = 1000
+
+    def lookups(self, request, model_admin):
+        statuses = set(OrderStatusRollup.objects.filter(
+            grain=RollupGrain.DAY
+        ).order_by('status').values_list('status', flat=True).distinct())
+        statuses.update(Order.objects.order_by('-id').values_list(
+            'status', flat=True
+        )[:self.RECENT_ORDERS])
+        return [(status, status) for status in sorted(statuses)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(status=self.value())
+        return queryset
 
 
 @admin.register(User)
@@ -9,8 +46,35 @@ class UserAdmin(admin.ModelAdmin):
 
     list_display = ('id', 'username')
     search_fields = ('username',)
-    list_filter = ('username',)
     list_display_links = ('username',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @staticmethod
+    def mark_orders_dirty(queryset):
+        """Метод отметки дней заказов пользователей для пересчета.
+
+        Заказы удаляются вместе с пользователем, поэтому их дни
+        отмечаются после фиксации удаления.
+        """
+        dates = set(Order.objects.filter(
+            user__in=queryset
+        ).order_by().annotate(
+            day=TruncDate('created_at')
+        ).values_list('day', flat=True).distinct())
+        transaction.on_commit(lambda: mark_daily_stats_dirty(dates))
+
+    def delete_model(self, request, obj):
+        """Метод удаления пользователя с отметкой дней его заказов."""
+        with transaction.atomic():
+            self.mark_orders_dirty(User.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        """Метод удаления пользователей с отметкой дней их заказов."""
+        with transaction.atomic():
+            self.mark_orders_dirty(queryset)
+            super().delete_queryset(request, queryset)
 
 
 class OrderItemInline(admin.TabularInline):
@@ -36,13 +100,90 @@ class OrderAdmin(admin.ModelAdmin):
 
     list_display = ('user', 'order_number', 'created_at',
                     'total_amount', 'status')
-    search_fields = ('user__username', 'order_number', 'created_at',
-                     'total_amount')
-    list_filter = ('user', 'order_number', 'created_at',
-                   'total_amount', 'status')
+    list_select_related = ('user',)
+    search_fields = ('=order_number', '=user__username')
+    list_filter = ('created_at', OrderStatusListFilter)
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at', '-id')
     list_display_links = ('order_number',)
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'content_hash')
+    autocomplete_fields = ('user',)
     inlines = (OrderItemInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @staticmethod
+    def get_order_states(queryset):
+        """Метод получения состояний заказов для учета в статистике."""
+        return [
+            OrderState(*values) for values in queryset.values_list(
+                'user_id', 'created_at', 'total_amount'
+            )
+        ]
+
+    @staticmethod
+    def apply_order_changes(changes):
+        """Метод учета изменений заказов из админки в статистике.
+
+        changes - пары состояний до и после записи, как
+        в apply_user_stats_changes. После фиксации транзакции
+        сбрасывается кэш статистики пользователей, а дни заказов
+        до и после изменения отмечаются для пересчета задачей
+        refresh_daily_stats.
+        """
+        apply_user_stats_changes(changes)
+        states = [
+            state for change in changes for state in change
+            if state is not None
+        ]
+        usernames = set(User.objects.filter(
+            id__in={state.user_id for state in states}
+        ).values_list('username', flat=True))
+        dates = {timezone.localdate(state.created_at) for state in states}
+        transaction.on_commit(lambda: invalidate_user_stats(usernames))
+        transaction.on_commit(lambda: mark_daily_stats_dirty(dates))
+
+    def save_model(self, request, obj, form, change):
+        """Метод сохранения заказа со сбросом хеша содержимого.
+
+        После правки в админке хеш не соответствует заказу, и без сброса
+        повторная загрузка того же заказа считалась бы неизмененной.
+        """
+        obj.content_hash = ''
+        previous = None
+        if change:
+            previous = self.get_order_states(
+                Order.objects.filter(pk=obj.pk)
+            )[0]
+        super().save_model(request, obj, form, change)
+        self.apply_order_changes([(
+            previous, OrderState(obj.user_id, obj.created_at, obj.total_amount)
+        )])
+
+    def delete_model(self, request, obj):
+        """Метод удаления заказа с учетом в статистике."""
+        with transaction.atomic():
+            previous = OrderState(
+                obj.user_id, obj.created_at, obj.total_amount
+            )
+            super().delete_model(request, obj)
+            self.apply_order_changes([(previous, None)])
+
+    def delete_queryset(self, request, queryset):
+        """Метод удаления выбранных заказов с учетом в статистике."""
+        with transaction.atomic():
+            changes = [
+                (previous, None)
+                for previous in self.get_order_states(queryset)
+            ]
+            super().delete_queryset(request, queryset)
+            self.apply_order_changes(changes)
+
+    def save_formset(self, request, form, formset, change):
+        """Метод сохранения товаров заказа со сбросом хеша содержимого."""
+        super().save_formset(request, form, formset, change)
+        if formset.has_changed():
+            Order.objects.filter(pk=form.instance.pk).update(content_hash='')
 
 
 @admin.register(OrderItem)
@@ -51,10 +192,14 @@ class OrderItemAdmin(admin.ModelAdmin):
 
     list_display = ('order', 'sku', 'name',
                     'quantity', 'price', 'total_price')
-    search_fields = ('sku', 'name', 'order__order_number',
-                     'quantity', 'price')
-    list_filter = ('order__user', 'order')
+    list_select_related = ('order__user',)
+    search_fields = ('=sku', '=order__order_number',
+                     '=order__user__username')
     list_display_links = ('sku',)
+    ordering = ('-id',)
+    raw_id_fields = ('order',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def total_price(self, obj):
         """Метод расчета общей стоимости позиции."""
@@ -65,6 +210,16 @@ class OrderItemAdmin(admin.ModelAdmin):
     total_price.short_description = 'Общая стоимость'
 
 
+@admin.register(UserOrderStats)
+class UserOrderStatsAdmin(admin.ModelAdmin):
+    """Модель UserOrderStatsAdmin."""
+
+    list_display = ('user', 'orders_count', 'total_revenue')
+    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'orders_count', 'total_revenue')
+
+
 @admin.register(DailyOrderStats)
 class DailyOrderStatsAdmin(admin.ModelAdmin):
     """Модель DailyOrderStatsAdmin."""
@@ -74,3 +229,22 @@ class DailyOrderStatsAdmin(admin.ModelAdmin):
     list_filter = ('date',)
     readonly_fields = ('created_at',)
     ordering = ('-date',)
+
+
+@admin.register(DailyStatsDirtyDate)
+class DailyStatsDirtyDateAdmin(admin.ModelAdmin):
+    """Модель DailyStatsDirtyDateAdmin."""
+
+    list_display = ('date', 'marked_at')
+    readonly_fields = ('date', 'marked_at')
+
+
+@admin.register(UploadJob)
+class UploadJobAdmin(admin.ModelAdmin):
+    """Модель UploadJobAdmin."""
+
+    list_display = ('id', 'status', 'processed_orders', 'total_orders',
+                    'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+    exclude = ('payload',)
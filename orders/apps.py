@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class OrdersConfig(AppConfig):
@@ -7,3 +9,8 @@ class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
     verbose_name = 'Заказы'
+
+    def ready(self):
+        if settings.ORDERS_METRICS_ENABLED:
+            from .metrics import install_query_recorder
+            connection_created.connect(install_query_recorder)
@@ -0,0 +1,209 @@
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
+from rest_framework.utils.urls import replace_query_param
+
+from .cache import aget_user_stats, aset_user_stats
+from .log import Truncated
+from .models import DailyOrderStats, User, UserOrderStats
+from .serializers import (DailyStatsQuerySerializer, DailyStatsSerializer,
+                          OrderUploadSerializer, UserStatsSerializer)
+from .views import (DAILY_STATS_VERSION, DailyStatsViewSet,
+                    get_daily_stats_version)
+
+logger = logging.getLogger('orders')
+
+JSON_PARAMS = {'ensure_ascii': False}
+
+
+def json_response(data, **kwargs):
+    """Функция формирования JSON-ответа в формате ответов API."""
+    return JsonResponse(
+        data, safe=False, json_dumps_params=JSON_PARAMS, **kwargs
+    )
+
+
+async def user_stats(request):
+    """Асинхронное представление статистики заказов пользователя.
+
+    Повторяет /api/orders/stats/: статистика читается из кэша, при
+    промахе - одним запросом пользователя с UserOrderStats через
+    асинхронный ORM.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(('GET',))
+    username = request.GET.get('user', '').strip()
+    if not username:
+        logger.warning('Запрос статистики без параметра user.')
+        route = '/api/async/orders/stats/?user=username'
+        return json_response(
+            {'error': f'Параметр user обязателен. Используйте: {route}.'},
+            status=400
+        )
+
+    stats_data, version = await aget_user_stats(username)
+    cache_status = 'HIT'
+    if stats_data is None:
+        cache_status = 'MISS'
+        user = await User.objects.select_related('order_stats').filter(
+            username=username
+        ).afirst()
+        if user is None:
+            logger.warning('Пользователь не найден: %s.', username)
+            return json_response(
+                {'error': f'Пользователь {username} не найден.'},
+                status=404
+            )
+        try:
+            stats = user.order_stats
+        except UserOrderStats.DoesNotExist:
+            stats = UserOrderStats(user=user)
+        stats_data = {
+            'user': username,
+            'orders_count': stats.orders_count,
+            'total_revenue': stats.total_revenue,
+            'avg_order_value': stats.avg_order_value
+        }
+        await aset_user_stats(username, version, stats_data)
+
+    response = json_response(UserStatsSerializer(stats_data).data)
+    response['X-Cache'] = cache_status
+    return response
+
+
+async def daily_stats(request):
+    """Асинхронное представление ежедневной статистики.
+
+    Повторяет /api/daily-stats/daily_stats/ (параметры from, to,
+    page_size, ETag и Last-Modified) с пагинацией по дате: параметр
+    cursor - дата последнего дня предыдущей страницы, переход только
+    вперед по ссылке next.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(('GET',))
+    query_serializer = DailyStatsQuerySerializer(
+        data={
+            field: request.GET[param]
+            for param, field in DailyStatsViewSet.DAILY_STATS_PARAMS.items()
+            if param in request.GET
+        }
+    )
+    if not query_serializer.is_valid():
+        logger.warning('Ошибки валидации: %s.', query_serializer.errors)
+        return json_response(query_serializer.errors, status=400)
+
+    stats = DailyOrderStats.objects.all()
+    if 'date_from' in query_serializer.validated_data:
+        stats = stats.filter(
+            date__gte=query_serializer.validated_data['date_from']
+        )
+    if 'date_to' in query_serializer.validated_data:
+        stats = stats.filter(
+            date__lte=query_serializer.validated_data['date_to']
+        )
+
+    etag, last_modified = get_daily_stats_version(
+        await stats.aaggregate(**DAILY_STATS_VERSION)
+    )
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if not_modified is not None:
+        return not_modified
+
+    page = stats.order_by('-date')
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        cursor_date = parse_date(cursor)
+        if cursor_date is None:
+            return json_response({'detail': 'Некорректный курсор.'},
+                                 status=404)
+        page = page.filter(date__lt=cursor_date)
+    page_size = get_page_size(request)
+    rows = [row async for row in page[:page_size + 1]]
+
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_url = replace_query_param(
+            request.build_absolute_uri(), 'cursor', rows[-1].date.isoformat()
+        )
+    response = json_response({
+        'next': next_url,
+        'previous': None,
+        'results': DailyStatsSerializer(rows, many=True).data,
+    })
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def get_page_size(request):
+    """Функция получения размера страницы ежедневной статистики."""
+    try:
+        page_size = int(request.GET['page_size'])
+    except (KeyError, ValueError):
+        return settings.ORDERS_DAILY_STATS_PAGE_SIZE
+    if page_size < 1:
+        return settings.ORDERS_DAILY_STATS_PAGE_SIZE
+    return min(page_size, settings.ORDERS_DAILY_STATS_MAX_PAGE_SIZE)
+
+
+def validate_upload(body):
+    """Функция разбора и валидации тела загрузки заказов.
+
+    Возвращает сериализатор после is_valid, при некорректном JSON
+    выбрасывает ValueError.
+    """
+    serializer = OrderUploadSerializer(data=json.loads(body))
+    serializer.is_valid()
+    return serializer
+
+
+async def upload_orders(request):
+    """Асинхронное представление загрузки заказов.
+
+    Повторяет /api/orders/upload/ без параметра async. Разбор
+    и валидация тела нагружают процессор, поэтому выполняются
+    в отдельном потоке (валидация не обращается к БД), чтобы
+    не блокировать event loop; запись заказов в транзакции
+    выполняется в потоке ORM через sync_to_async.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(('POST',))
+    try:
+        serializer = await sync_to_async(
+            validate_upload, thread_sensitive=False
+        )(request.body)
+    except ValueError as e:
+        return json_response({'detail': f'Некорректный JSON: {e}.'},
+                             status=400)
+    if serializer.errors:
+        logger.warning('Ошибки валидации: %s.', Truncated(serializer.errors))
+        return json_response(serializer.errors, status=400)
+
+    result = await sync_to_async(serializer.save)()
+    logger.info('Заказ(ы) успешно сохранены в базу.')
+    return json_response(
+        {'message': 'Заказ(ы) успешно загружены/обновлены.',
+         'statistics': {
+             'created_orders': result['created_orders'],
+             'updated_orders': result['updated_orders'],
+             'unchanged_orders': result['unchanged_orders'],
+             'created_items': result['created_items'],
+         }},
+        status=201
+    )
+
+
+# Загрузка принимает JSON без сессии, как и APIView DRF. csrf_exempt
+# в Django 4.2 оборачивает представление синхронной функцией, поэтому
+# отметка ставится напрямую.
+upload_orders.csrf_exempt = True
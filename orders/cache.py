@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('orders')
+
+USER_STATS_KEY = 'orders:user-stats:{}:{}'
+USER_STATS_VERSION_KEY = 'orders:user-stats-version:{}'
+USER_STATS_HITS_KEY = 'orders:user-stats:hits'
+USER_STATS_MISSES_KEY = 'orders:user-stats:misses'
+
+
+def get_username_hash(username):
+    """Функция получения хэша имени пользователя для ключей кэша."""
+    return hashlib.md5(username.encode()).hexdigest()
+
+
+def user_stats_key(username, version):
+    """Функция получения ключа кэша статистики пользователя."""
+    return USER_STATS_KEY.format(get_username_hash(username), version)
+
+
+def user_stats_version_key(username):
+    """Функция получения ключа версии статистики пользователя."""
+    return USER_STATS_VERSION_KEY.format(get_username_hash(username))
+
+
+def increment(key):
+    """Функция увеличения счетчика в кэше."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_user_stats(username):
+    """Функция получения статистики пользователя из кэша.
+
+    Возвращает статистику (None при промахе) и ее версию, которую
+    нужно передать в set_user_stats. Версия читается до запроса к БД:
+    если кэш сбросят, пока статистика читается из БД, устаревшие
+    данные сохранятся под старой версией и читаться не будут.
+    Попадания и промахи учитываются в счетчиках.
+    """
+    version = cache.get(user_stats_version_key(username))
+    stats = None
+    if version is not None:
+        stats = cache.get(user_stats_key(username, version))
+    increment(USER_STATS_MISSES_KEY if stats is None else USER_STATS_HITS_KEY)
+    return stats, version
+
+
+def set_user_stats(username, version, stats):
+    """Функция сохранения статистики пользователя в кэш.
+
+    Если версии при чтении не было, она создается только сейчас, для
+    найденного пользователя; если ее за это время создал сброс кэша,
+    статистика не сохраняется. Версия живет не меньше статистики:
+    после ее истечения будет только промах.
+    """
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(
+            user_stats_version_key(username), version,
+            timeout=settings.ORDERS_STATS_CACHE_TIMEOUT
+        ):
+            return
+    cache.set(
+        user_stats_key(username, version), stats,
+        timeout=settings.ORDERS_STATS_CACHE_TIMEOUT
+    )
+
+
+async def aincrement(key):
+    """Асинхронная функция увеличения счетчика в кэше."""
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, timeout=None):
+            await cache.aincr(key)
+
+
+async def aget_user_stats(username):
+    """Асинхронная функция получения статистики пользователя из кэша."""
+    version = await cache.aget(user_stats_version_key(username))
+    stats = None
+    if version is not None:
+        stats = await cache.aget(user_stats_key(username, version))
+    await aincrement(
+        USER_STATS_MISSES_KEY if stats is None else USER_STATS_HITS_KEY
+    )
+    return stats, version
+
+
+async def aset_user_stats(username, version, stats):
+    """Асинхронная функция сохранения статистики пользователя в кэш."""
+    if version is None:
+        version = uuid.uuid4().hex
+        if not await cache.aadd(
+            user_stats_version_key(username), version,
+            timeout=settings.ORDERS_STATS_CACHE_TIMEOUT
+        ):
+            return
+    await cache.aset(
+        user_stats_key(username, version), stats,
+        timeout=settings.ORDERS_STATS_CACHE_TIMEOUT
+    )
+
+
+def invalidate_user_stats(usernames):
+    """Функция сброса кэша статистики пользователей.
+
+    Пользователям назначается новая версия статистики, записи
+    под старыми версиями удаляются по истечении времени жизни.
+    Версия живет столько же, сколько статистика.
+    """
+    usernames = list(usernames)
+    version = uuid.uuid4().hex
+    cache.set_many(
+        {user_stats_version_key(username): version
+         for username in usernames},
+        timeout=settings.ORDERS_STATS_CACHE_TIMEOUT
+    )
+    logger.debug('Сброшен кэш статистики пользователей: %s.', usernames)
+
+
+def get_user_stats_counters():
+    """Функция получения счетчиков попаданий и промахов кэша статистики."""
+    counters = cache.get_many((USER_STATS_HITS_KEY, USER_STATS_MISSES_KEY))
+    hits = counters.get(USER_STATS_HITS_KEY, 0)
+    misses = counters.get(USER_STATS_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0,
+    }
@@ -0,0 +1,185 @@
+import csv
+import io
+import json
+from collections import defaultdict
+
+from core.constants import OrderConstants
+
+from .models import OrderItem
+
+ORDER_EXPORT_FIELDS = ('order_number', 'user', 'created_at',
+                       'total_amount', 'status')
+ITEM_EXPORT_FIELDS = ('sku', 'name', 'quantity', 'price')
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+EXPORT_FORMATS = tuple(EXPORT_CONTENT_TYPES)
+
+
+def iter_order_chunks(queryset, chunk_size):
+    """Генератор пачек заказов с товарами для выгрузки.
+
+    Заказы читаются по ключу id (WHERE id > последний id пачки LIMIT
+    chunk_size), товары пачки - одним запросом. Серверные курсоры
+    не нужны (в настройках они отключены), а в памяти держится только
+    одна пачка. Каждая пачка - список пар (заказ, товары), где заказ -
+    кортеж полей ORDER_EXPORT_FIELDS, товар - ITEM_EXPORT_FIELDS.
+    """
+    last_id = 0
+    while True:
+        orders = list(queryset.filter(id__gt=last_id).order_by(
+            'id'
+        ).values_list(
+            'id', 'order_number', 'user__username', 'created_at',
+            'total_amount', 'status'
+        )[:chunk_size])
+        if not orders:
+            return
+        items = defaultdict(list)
+        for order_id, *item in OrderItem.objects.filter(
+            order_id__in=[order[0] for order in orders]
+        ).order_by('order_id', 'id').values_list(
+            'order_id', *ITEM_EXPORT_FIELDS
+        ):
+            items[order_id].append(item)
+        yield [(order[1:], items[order[0]]) for order in orders]
+        last_id = orders[-1][0]
+
+
+def export_csv(chunks):
+    """Генератор выгрузки в CSV: строка на товар с полями заказа.
+
+    Заказ без товаров выгружается одной строкой с пустыми полями товара.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ORDER_EXPORT_FIELDS + ITEM_EXPORT_FIELDS)
+    empty_item = ('',) * len(ITEM_EXPORT_FIELDS)
+    for chunk in chunks:
+        for order, items in chunk:
+            order = (*order[:2], order[2].isoformat(), *order[3:])
+            writer.writerows(
+                (*order, *item) for item in items or (empty_item,)
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_ndjson(chunks):
+    """Генератор выгрузки в NDJSON: строка на заказ с товарами.
+
+    Формат строки совпадает с заказом загрузки (плюс поле user).
+    """
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps({
+                'order_number': order_number,
+                'user': user,
+                'created_at': created_at.isoformat(),
+                'total_amount': str(total_amount),
+                'status': order_status,
+                'items': [
+                    {'sku': sku, 'name': name, 'quantity': quantity,
+                     'price': str(price)}
+                    for sku, name, quantity, price in items
+                ],
+            }, ensure_ascii=False) + '\n'
+            for (order_number, user, created_at, total_amount,
+                 order_status), items in chunk
+        )
+
+
+class ParquetSink(io.RawIOBase):
+    """Поток записи, отдающий накопленные байты по требованию."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def pop(self):
+        """Метод получения и сброса накопленных байтов."""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_parquet(chunks):
+    """Генератор выгрузки в Parquet: группа строк на пачку заказов.
+
+    Строка на товар с полями заказа, как в CSV. Требует pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema((
+        ('order_number', pa.string()),
+        ('user', pa.string()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+        ('total_amount', pa.decimal128(
+            OrderConstants.MAX_TOTAL_AMOUNT,
+            OrderConstants.MAX_DECIMAL_PLACES
+        )),
+        ('status', pa.string()),
+        ('sku', pa.string()),
+        ('name', pa.string()),
+        ('quantity', pa.int64()),
+        ('price', pa.decimal128(
+            OrderConstants.MAX_PRICE_DIGITS,
+            OrderConstants.MAX_DECIMAL_PLACES
+        )),
+    ))
+    empty_item = (None,) * len(ITEM_EXPORT_FIELDS)
+    sink = ParquetSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            rows = [
+                (*order, *item)
+                for order, items in chunk for item in items or (empty_item,)
+            ]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type)
+                 for column, field in zip(zip(*rows), schema)],
+                schema=schema
+            ))
+            yield sink.pop()
+    yield sink.pop()
+
+
+EXPORTERS = {
+    'csv': export_csv,
+    'ndjson': export_ndjson,
+    'parquet': export_parquet,
+}
+
+
+def export_orders(queryset, export_format, chunk_size):
+    """Функция выгрузки заказов в заданном формате.
+
+    Возвращает генератор строк (CSV, NDJSON) или байтов (Parquet).
+    """
+    if export_format == 'parquet':
+        check_parquet_support()
+    return EXPORTERS[export_format](iter_order_chunks(queryset, chunk_size))
+
+
+def check_parquet_support():
+    """Функция проверки наличия pyarrow для выгрузки в Parquet."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError('Для выгрузки в Parquet установите pyarrow.')
@@ -0,0 +1,14 @@
+from django_filters import rest_framework as filters
+
+from .models import Order
+
+
+class OrderFilter(filters.FilterSet):
+    """Фильтр заказов по пользователю, статусу и периоду создания."""
+
+    user = filters.CharFilter(field_name='user__username')
+    created_at = filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = Order
+        fields = ('user', 'status', 'created_at')
@@ -0,0 +1,284 @@
+import csv
+import gzip
+import io
+import json
+import logging
+from collections import defaultdict
+from itertools import groupby
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .export import ITEM_EXPORT_FIELDS, ORDER_EXPORT_FIELDS
+from .models import Order, OrderItem, User
+from .serializers import OrderStreamValidator, UploadUserSerializer
+from .services import OrderUploadService, get_order_hash
+from .stats import mark_daily_stats_dirty, rebuild_dirty_daily_stats
+
+logger = logging.getLogger('orders')
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+def open_import_file(path):
+    """Функция открытия файла импорта (в том числе .gz) на чтение."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def get_import_format(path):
+    """Функция определения формата файла импорта по расширению."""
+    extension = path.removesuffix('.gz').rsplit('.', 1)[-1].lower()
+    return extension if extension in IMPORT_FORMATS else None
+
+
+def read_ndjson(stream):
+    """Генератор записей NDJSON: (номер строки, данные, ошибка)."""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as exc:
+            yield line_number, None, f'Некорректный JSON: {exc}.'
+
+
+def read_csv(stream):
+    """Генератор записей CSV: (номер строки, данные, ошибка).
+
+    Формат совпадает с выгрузкой export_orders: строка на товар с полями
+    заказа, строки одного заказа идут подряд, у заказа без товаров поля
+    товара пустые.
+    """
+    reader = csv.DictReader(stream)
+    missing = set(ORDER_EXPORT_FIELDS + ITEM_EXPORT_FIELDS) - set(
+        reader.fieldnames or ()
+    )
+    if missing:
+        yield 1, None, f'В заголовке нет колонок: {sorted(missing)}.'
+        return
+    rows = ((reader.line_num, row) for row in reader)
+    for _, order_rows in groupby(
+        rows, key=lambda numbered: numbered[1]['order_number']
+    ):
+        order_rows = list(order_rows)
+        line_number, first = order_rows[0]
+        data = {field: first[field] for field in ORDER_EXPORT_FIELDS}
+        data['items'] = [
+            {field: row[field] for field in ITEM_EXPORT_FIELDS}
+            for _, row in order_rows if row['sku']
+        ]
+        yield line_number, data, None
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+
+class OrderImportValidator(OrderStreamValidator):
+    """Валидатор заказов импорта.
+
+    Правила те же, что у загрузки; дополнительно проверяется пользователь
+    заказа (поле user или пользователь по умолчанию). Повторы номеров
+    заказов ищутся в пределах пачки: более поздний заказ из следующих
+    пачек перезапишет ранний, как при повторной загрузке.
+    """
+
+    def __init__(self, max_errors, default_user=None):
+        super().__init__(max_errors)
+        self.default_user = default_user
+        self.users = {}
+        self.user_field = UploadUserSerializer().fields['user']
+
+    def __call__(self, lines):
+        """Генератор валидированных заказов пачки."""
+        self.order_numbers = set()
+        return super().__call__(lines)
+
+    def validate_order(self, data):
+        """Метод проверки заказа и его пользователя."""
+        order_data, errors = super().validate_order(data)
+        if errors:
+            return None, errors
+        username = self.default_user or data.get('user')
+        if username not in self.users:
+            try:
+                self.users[username] = UploadUserSerializer().validate_user(
+                    self.user_field.run_validation(username)
+                )
+            except serializers.ValidationError as exc:
+                return None, {'user': exc.detail}
+        return {**order_data, 'user': self.users[username]}, None
+
+
+class BulkOrderLoader:
+    """Запись пачек импорта через OrderUploadService.
+
+    Пачка делится по пользователям, заказы каждого пользователя
+    записываются сервисом загрузки (bulk_create/bulk_update), который
+    сам поддерживает агрегаты статистики.
+    """
+
+    def load(self, orders):
+        """Метод записи пачки заказов, возвращает число товаров."""
+        orders_by_user = defaultdict(list)
+        for order in orders:
+            orders_by_user[order['user']].append(order)
+        items_count = 0
+        for username, user_orders in orders_by_user.items():
+            result = OrderUploadService(
+                username, batch_size=len(user_orders)
+            ).upload(user_orders)
+            items_count += result['created_items']
+        return items_count
+
+    def finish(self):
+        """Метод завершения импорта (агрегаты уже обновлены)."""
+
+
+class PostgresOrderLoader:
+    """Запись пачек импорта через COPY в промежуточные таблицы.
+
+    Пачка копируется во временные таблицы и переносится в таблицы
+    заказов и товаров несколькими INSERT ... SELECT с ON CONFLICT.
+    Заказы, хеш содержимого которых совпадает с сохраненным, из пачки
+    исключаются до переноса.
+    Агрегаты статистики при этом не обновляются: дни заказов каждой
+    пачки отмечаются для пересчета в ее транзакции, после импорта
+    статистика пересчитывается за отмеченные дни и по всем
+    пользователям. Отметки сохраняются в БД, поэтому после
+    продолжения импорта с контрольной точки пересчитываются и дни
+    пачек, записанных до сбоя.
+    """
+
+    stage_orders = 'orders_import_order'
+    stage_items = 'orders_import_item'
+
+    def __init__(self):
+        self.qn = connection.ops.quote_name
+
+    def create_stage_tables(self, cursor):
+        """Метод создания временных таблиц импорта."""
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {self.stage_orders} ('
+            f'order_number text, username text, created_at timestamptz, '
+            f'total_amount numeric, status text, content_hash text)'
+        )
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {self.stage_items} ('
+            f'order_number text, sku text, name text, quantity integer, '
+            f'price numeric)'
+        )
+        cursor.execute(f'TRUNCATE {self.stage_orders}, {self.stage_items}')
+
+    @staticmethod
+    def copy(cursor, table, columns, rows):
+        """Метод копирования строк в таблицу через COPY FROM STDIN."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        sql = (f'COPY {table} ({", ".join(columns)}) '
+               f'FROM STDIN WITH (FORMAT csv)')
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            buffer.seek(0)
+            raw_cursor.copy_expert(sql, buffer)
+        else:
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    def load(self, orders):
+        """Метод записи пачки заказов, возвращает число товаров."""
+        user_table = self.qn(User._meta.db_table)
+        order_table = self.qn(Order._meta.db_table)
+        item_table = self.qn(OrderItem._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.create_stage_tables(cursor)
+            self.copy(
+                cursor, self.stage_orders,
+                ('order_number', 'username', 'created_at', 'total_amount',
+                 'status', 'content_hash'),
+                ((order['order_number'], order['user'],
+                  order['created_at'].isoformat(), order['total_amount'],
+                  order['status'], get_order_hash(order['user'], order))
+                 for order in orders)
+            )
+            self.copy(
+                cursor, self.stage_items,
+                ('order_number', 'sku', 'name', 'quantity', 'price'),
+                ((order['order_number'], item['sku'], item['name'],
+                  item['quantity'], item['price'])
+                 for order in orders for item in order['items'])
+            )
+
+            # Неизмененные заказы не переносятся.
+            cursor.execute(
+                f'DELETE FROM {self.stage_orders} s USING {order_table} o '
+                f'WHERE o.order_number = s.order_number '
+                f'AND o.content_hash = s.content_hash'
+            )
+            cursor.execute(
+                f'DELETE FROM {self.stage_items} i WHERE NOT EXISTS ('
+                f'SELECT 1 FROM {self.stage_orders} s '
+                f'WHERE s.order_number = i.order_number)'
+            )
+
+            # Дни заказов до и после импорта - для пересчета статистики.
+            cursor.execute(
+                f'SELECT DISTINCT (created_at AT TIME ZONE %s)::date FROM ('
+                f'SELECT created_at FROM {self.stage_orders} UNION ALL '
+                f'SELECT o.created_at FROM {order_table} o '
+                f'JOIN {self.stage_orders} s USING (order_number)) dates',
+                (timezone.get_current_timezone_name(),)
+            )
+            mark_daily_stats_dirty(row[0] for row in cursor.fetchall())
+
+            cursor.execute(
+                f'INSERT INTO {user_table} (username) '
+                f'SELECT DISTINCT username FROM {self.stage_orders} '
+                f'ON CONFLICT (username) DO NOTHING'
+            )
+            cursor.execute(
+                f'INSERT INTO {order_table} (user_id, order_number, '
+                f'created_at, total_amount, status, content_hash) '
+                f'SELECT u.id, s.order_number, s.created_at, '
+                f's.total_amount, s.status, s.content_hash '
+                f'FROM {self.stage_orders} s '
+                f'JOIN {user_table} u ON u.username = s.username '
+                f'ON CONFLICT (order_number) DO UPDATE SET '
+                f'user_id = EXCLUDED.user_id, '
+                f'created_at = EXCLUDED.created_at, '
+                f'total_amount = EXCLUDED.total_amount, '
+                f'status = EXCLUDED.status, '
+                f'content_hash = EXCLUDED.content_hash'
+            )
+            cursor.execute(
+                f'DELETE FROM {item_table} i USING {order_table} o, '
+                f'{self.stage_orders} s WHERE i.order_id = o.id '
+                f'AND o.order_number = s.order_number'
+            )
+            cursor.execute(
+                f'INSERT INTO {item_table} '
+                f'(order_id, sku, name, quantity, price) '
+                f'SELECT o.id, i.sku, i.name, i.quantity, i.price '
+                f'FROM {self.stage_items} i '
+                f'JOIN {order_table} o ON o.order_number = i.order_number'
+            )
+            return cursor.rowcount
+
+    def finish(self):
+        """Метод пересчета агрегатов статистики после импорта."""
+        call_command('rebuild_user_stats')
+        rebuild_dirty_daily_stats()
+
+
+def get_order_loader():
+    """Функция выбора способа записи пачек импорта по СУБД."""
+    if connection.vendor == 'postgresql':
+        return PostgresOrderLoader()
+    return BulkOrderLoader()
@@ -0,0 +1,154 @@
+import copy
+import json
+import logging
+import os
+import reprlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+# Атрибуты LogRecord, не относящиеся к полям extra.
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord(
+    '', logging.INFO, '', 0, '', None, None
+))) | {'message', 'asctime'}
+
+
+class OrdersQueueHandler(QueueHandler):
+    """Обработчик журнала с записью в фоновом потоке.
+
+    Вызывающий поток только формирует сообщение и кладет запись
+    в очередь, запись в файл и консоль (handlers) выполняет поток
+    QueueListener. В дочернем процессе после fork (воркеры Celery,
+    gunicorn) очередь и поток создаются заново.
+
+    В LOGGING обработчики передаются ссылками cfg://handlers.<имя>.
+    """
+
+    def __init__(self, handlers, respect_handler_level=True):
+        self.handlers = [handlers[i] for i in range(len(handlers))]
+        self.respect_handler_level = respect_handler_level
+        self.listener = None
+        super().__init__(SimpleQueue())
+        self.start()
+        os.register_at_fork(after_in_child=self.restart)
+
+    def start(self):
+        """Метод запуска потока записи журнала."""
+        self.listener = QueueListener(
+            self.queue, *self.handlers,
+            respect_handler_level=self.respect_handler_level
+        )
+        self.listener.start()
+
+    def restart(self):
+        """Метод пересоздания очереди и потока в дочернем процессе."""
+        self.queue = SimpleQueue()
+        self.start()
+
+    def prepare(self, record):
+        """Метод подготовки записи к передаче в поток записи.
+
+        Сообщение собирается из аргументов, трассировка исключения
+        форматируется в текст; оформление (время, уровень, JSON)
+        выполняет форматтер обработчика в потоке записи.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def close(self):
+        """Метод остановки потока с записью оставшихся сообщений."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматтер журнала в JSON (одна запись - одна строка).
+
+    Поля: time (UTC, ISO 8601), level, logger, module, process, thread,
+    message, exception (если есть) и поля, переданные через extra.
+    """
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(
+                record.created, tz=timezone.utc
+            ).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key not in data:
+                data[key] = value
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LogRepr(reprlib.Repr):
+    """Сокращенное представление вложенных данных для журнала.
+
+    В отличие от reprlib.Repr сокращает и наследников dict и list
+    (ReturnDict, ReturnList DRF), не строя их полное представление.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.maxlevel = 3
+        self.maxdict = 10
+        self.maxlist = 10
+        self.maxtuple = 10
+        self.maxset = 10
+        self.maxstring = 200
+        self.maxother = 200
+
+    def shorten(self, value):
+        """Метод сокращения значения; строки выводятся без кавычек."""
+        if not isinstance(value, str):
+            return self.repr(value)
+        if len(value) <= self.maxstring:
+            return value
+        return (f'{value[:self.maxstring]}... '
+                f'(+{len(value) - self.maxstring} симв.)')
+
+    def repr1(self, value, level):
+        if isinstance(value, dict) and type(value) is not dict:
+            return self.repr_dict(value, level)
+        if isinstance(value, list) and type(value) is not list:
+            return self.repr_list(value, level)
+        return super().repr1(value, level)
+
+
+log_repr = LogRepr()
+
+
+class Truncated:
+    """Аргумент журнала, сокращаемый только при форматировании записи.
+
+    Большие структуры (тело запроса, списки номеров заказов, ошибки
+    валидации, параметры SQL) выводятся первыми элементами каждого
+    уровня, длинные строки - началом.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return log_repr.shorten(self.value)
@@ -0,0 +1,124 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from orders.models import Order
+from orders.stats import (iter_date_ranges, rebuild_daily_stats,
+                          rebuild_dirty_daily_stats)
+from orders.tasks import backfill_daily_stats
+
+
+class Command(BaseCommand):
+    """Пересчет ежедневной статистики заказов за период."""
+
+    help = (
+        'Пересчитывает DailyOrderStats за период (по умолчанию - с даты '
+        'первого заказа по вчера) отрезками по --chunk-days дней. '
+        'Отрезки обрабатываются в --workers процессах или, с --celery, '
+        'задачами на воркерах Celery. С --dirty пересчитываются только '
+        'дни, затронутые загрузками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from', dest='date_from', type=date.fromisoformat,
+            help='Начало периода в формате YYYY-MM-DD.'
+        )
+        parser.add_argument(
+            '--to', dest='date_to', type=date.fromisoformat,
+            help='Конец периода включительно в формате YYYY-MM-DD '
+                 '(по умолчанию - вчера).'
+        )
+        parser.add_argument(
+            '--chunk-days', type=int, default=7,
+            help='Количество дней в одном отрезке.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество локальных процессов.'
+        )
+        parser.add_argument(
+            '--celery', action='store_true',
+            help='Поставить пересчет в очередь Celery.'
+        )
+        parser.add_argument(
+            '--dirty', action='store_true',
+            help='Пересчитать только дни, затронутые загрузками.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['dirty']:
+            days = rebuild_dirty_daily_stats()
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчитана статистика затронутых дней: {days} '
+                f'за {time.perf_counter() - started:.1f} с.'
+            ))
+            return
+
+        if options['chunk_days'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-days и --workers должны быть '
+                               'больше нуля.')
+        date_to = options['date_to'] or (
+            timezone.localdate() - timedelta(days=1)
+        )
+        date_from = options['date_from'] or self.get_first_order_date()
+        if date_from is None:
+            raise CommandError('В базе нет заказов, укажите --from.')
+        if date_from > date_to:
+            raise CommandError('Начало периода позже его конца.')
+
+        if options['celery']:
+            backfill_daily_stats.delay(
+                date_from.isoformat(), date_to.isoformat(),
+                options['chunk_days']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчет статистики за {date_from} - {date_to} '
+                f'поставлен в очередь Celery.'
+            ))
+            return
+
+        chunks = list(iter_date_ranges(
+            date_from, date_to, options['chunk_days']
+        ))
+        if options['workers'] == 1:
+            days = sum(rebuild_daily_stats(*chunk) for chunk in chunks)
+        else:
+            days = self.rebuild_in_processes(chunks, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитана статистика за {date_from} - {date_to}: '
+            f'{days} дн., {len(chunks)} отрезков, '
+            f'{time.perf_counter() - started:.1f} с.'
+        ))
+
+    @staticmethod
+    def get_first_order_date():
+        """Метод получения даты первого заказа."""
+        created_at = Order.objects.order_by('created_at').values_list(
+            'created_at', flat=True
+        ).first()
+        return created_at and timezone.localdate(created_at)
+
+    def rebuild_in_processes(self, chunks, workers):
+        """Метод пересчета отрезков в пуле процессов."""
+        # Дочерние процессы не должны наследовать открытые соединения
+        # с БД: каждый откроет свое.
+        connections.close_all()
+        days = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(rebuild_daily_stats, *chunk): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                date_from, date_to = futures[future]
+                days += future.result()
+                self.stdout.write(
+                    f'  {date_from} - {date_to}: готово.'
+                )
+        return days
@@ -0,0 +1,136 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Нагрузочное сравнение HTTP-эндпоинтов."""
+
+    help = (
+        'Отправляет на каждый URL заданное число запросов с заданной '
+        'параллельностью и выводит запросы в секунду, задержки '
+        '(p50, p95, p99, максимум) и число ошибок. Используется для '
+        'сравнения WSGI- и ASGI-развертываний, например: '
+        'bench_http http://127.0.0.1:8000/api/orders/stats/?user=u '
+        'http://127.0.0.1:8001/api/async/orders/stats/?user=u'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Адреса для сравнения.')
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Количество запросов на каждый URL.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=64,
+            help='Количество одновременных запросов.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=50,
+            help='Количество разогревочных запросов (не учитываются).'
+        )
+        parser.add_argument(
+            '--method', default='GET', choices=('GET', 'POST'),
+            help='HTTP-метод.'
+        )
+        parser.add_argument(
+            '--body', help='Файл с телом запроса (для POST).'
+        )
+        parser.add_argument(
+            '--content-type', default='application/json',
+            help='Content-Type тела запроса.'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=30,
+            help='Таймаут запроса (секунды).'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests и --concurrency должны быть '
+                               'больше нуля.')
+        body = None
+        if options['body']:
+            with open(options['body'], 'rb') as file:
+                body = file.read()
+
+        for url in options['urls']:
+            if urlsplit(url).scheme not in ('http', 'https'):
+                raise CommandError(f'Неподдерживаемый адрес: {url}.')
+            result = self.run(url, body, options)
+            self.stdout.write(self.format_result(url, result))
+
+    def run(self, url, body, options):
+        """Метод нагрузки одного URL, возвращает задержки и ошибки.
+
+        Каждый поток держит свое keep-alive соединение, после ошибки
+        соединение открывается заново.
+        """
+        parts = urlsplit(url)
+        connection_class = (
+            HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        )
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        headers = {'Content-Type': options['content_type']} if body else {}
+        local = threading.local()
+
+        def send(_):
+            connection = getattr(local, 'connection', None)
+            if connection is None:
+                connection = local.connection = connection_class(
+                    parts.netloc, timeout=options['timeout']
+                )
+            started = time.perf_counter()
+            try:
+                connection.request(
+                    options['method'], path, body=body, headers=headers
+                )
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (HTTPException, OSError):
+                connection.close()
+                local.connection = None
+                ok = False
+            return time.perf_counter() - started, ok
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(send, range(options['warmup'])))
+            started = time.perf_counter()
+            results = list(executor.map(send, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        return {
+            'elapsed': elapsed,
+            'latencies': latencies,
+            'errors': sum(1 for _, ok in results if not ok),
+        }
+
+    @staticmethod
+    def format_result(url, result):
+        """Метод форматирования результата нагрузки URL."""
+        latencies = result['latencies']
+
+        def percentile(value):
+            index = min(len(latencies) - 1,
+                        int(len(latencies) * value / 100))
+            return latencies[index] * 1000
+
+        return (
+            f'{url}\n'
+            f'  запросов/с: {len(latencies) / result["elapsed"]:.1f}, '
+            f'ошибок: {result["errors"]} из {len(latencies)}\n'
+            f'  задержка, мс: среднее '
+            f'{statistics.mean(latencies) * 1000:.1f}, '
+            f'p50 {percentile(50):.1f}, p95 {percentile(95):.1f}, '
+            f'p99 {percentile(99):.1f}, '
+            f'максимум {latencies[-1] * 1000:.1f}'
+        )
@@ -0,0 +1,150 @@
+import gc
+import io
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from orders import parsers, renderers
+from orders.models import Order, OrderItem, User
+from orders.parsers import FastJSONParser
+from orders.renderers import FastJSONRenderer
+from orders.seed import OrderGenerator
+from orders.serializers import OrderDetailSerializer
+from orders.services import ORDER_FIELDS
+
+
+class Command(BaseCommand):
+    """Сравнение JSONParser/JSONRenderer DRF с FastJSONParser/Renderer."""
+
+    help = (
+        'Замеряет разбор тела загрузки из --orders заказов, рендеринг '
+        'ответа из --export-orders заказов в формате /api/orders/ '
+        'и тех же заказов с Decimal и datetime в значениях парсером '
+        'и рендерером DRF на модуле json и FastJSONParser/'
+        'FastJSONRenderer на orjson. Выводит медиану '
+        '--repeat замеров, ускорение и совпадение результатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders', type=int, default=10000,
+            help='Количество заказов в теле загрузки.'
+        )
+        parser.add_argument(
+            '--export-orders', type=int, default=100000,
+            help='Количество заказов в ответе.'
+        )
+        parser.add_argument(
+            '--items', type=int, default=3,
+            help='Среднее количество товаров в заказе.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество замеров каждой операции.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел.'
+        )
+
+    def handle(self, *args, **options):
+        if parsers.orjson is None or renderers.orjson is None:
+            raise CommandError('Для сравнения установите orjson.')
+        if min(options['orders'], options['export_orders'],
+               options['items'], options['repeat']) < 1:
+            raise CommandError('--orders, --export-orders, --items '
+                               'и --repeat должны быть больше нуля.')
+        generator = OrderGenerator(seed=options['seed'],
+                                   items=options['items'])
+
+        upload = [
+            generator.order(f'bench-{number:09d}')
+            for number in range(options['orders'])
+        ]
+        body = json.dumps(
+            {'user': 'bench', 'orders': upload}, cls=DjangoJSONEncoder
+        ).encode()
+        self.compare(
+            'Разбор загрузки', len(body), options['repeat'],
+            lambda: JSONParser().parse(io.BytesIO(body)),
+            lambda: FastJSONParser().parse(io.BytesIO(body))
+        )
+
+        export = [
+            generator.order(f'bench-{number:09d}')
+            for number in range(options['export_orders'])
+        ]
+        self.compare_render(
+            'Рендеринг заказов', options['repeat'],
+            {'results': self.serialize_orders(export)}
+        )
+        self.compare_render(
+            'Рендеринг Decimal и datetime', options['repeat'],
+            {'results': export}
+        )
+
+    @staticmethod
+    def serialize_orders(orders):
+        """Метод сериализации заказов, как в ответе /api/orders/.
+
+        Заказы не сохраняются в БД: товары передаются через кэш
+        prefetch_related.
+        """
+        user = User(username='bench')
+        instances = []
+        for number, order_data in enumerate(orders, start=1):
+            order = Order(
+                pk=number, user=user,
+                **{field: order_data[field] for field in ORDER_FIELDS}
+            )
+            order._prefetched_objects_cache = {'items': [
+                OrderItem(order=order, **item_data)
+                for item_data in order_data['items']
+            ]}
+            instances.append(order)
+        return OrderDetailSerializer(instances, many=True).data
+
+    def compare_render(self, name, repeat, data):
+        """Метод сравнения рендеринга данных ответа."""
+        self.compare(
+            name, len(FastJSONRenderer().render(data)), repeat,
+            lambda: JSONRenderer().render(data),
+            lambda: FastJSONRenderer().render(data)
+        )
+
+    def compare(self, name, size, repeat, default, fast):
+        """Метод замера и сравнения двух реализаций операции."""
+        default_time, default_result = self.measure(default, repeat)
+        fast_time, fast_result = self.measure(fast, repeat)
+        same = 'совпадает' if default_result == fast_result else 'ОТЛИЧАЕТСЯ'
+        self.stdout.write(
+            f'{name} ({size / 1024 / 1024:.1f} МБ): json '
+            f'{default_time * 1000:.1f} мс, orjson '
+            f'{fast_time * 1000:.1f} мс, ускорение '
+            f'{default_time / fast_time:.1f}x, результат {same}.'
+        )
+
+    @staticmethod
+    def measure(operation, repeat):
+        """Метод получения медианы времени операции и ее результата.
+
+        Как и в timeit, сборщик мусора на время замера отключается:
+        иначе время зависит от того, на какой замер пришлась сборка.
+        """
+        timings = []
+        for _ in range(repeat):
+            result = None
+            gc.collect()
+            gc.disable()
+            try:
+                started = time.perf_counter()
+                result = operation()
+                timings.append(time.perf_counter() - started)
+            finally:
+                gc.enable()
+        return statistics.median(timings), result
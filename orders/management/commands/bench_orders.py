@@ -0,0 +1,268 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from django.utils import timezone
+
+from orders.cache import invalidate_user_stats
+from orders.models import Order, UserOrderStats
+from orders.seed import OrderGenerator
+from orders.tasks import daily_order_stats
+
+# Параметры, от которых зависят результаты замеров.
+BENCH_OPTIONS = ('users', 'orders', 'items', 'days', 'seed', 'upload_size',
+                 'repeat')
+
+
+class Command(BaseCommand):
+    """Воспроизводимый замер производительности основных операций."""
+
+    help = (
+        'Создает тестовую БД (как manage.py test; на настройках '
+        'по умолчанию - SQLite в памяти), заполняет ее seed_orders '
+        'и замеряет через тестовый клиент Django загрузку новых '
+        'заказов (upload_create), повторную загрузку измененных '
+        '(upload_update), статистику пользователя без кэша (user_stats), '
+        'ежедневную статистику (daily_stats) и задачу daily_order_stats. '
+        'Для каждого замера выводятся время (среднее, медиана, минимум, '
+        'максимум), число SQL-запросов и пиковая память (tracemalloc). '
+        'С --output результаты сохраняются в JSON, с --compare '
+        'сравниваются с сохраненными ранее. Таблицы тестовой БД '
+        'создаются миграциями: если их еще нет, сначала выполните '
+        'python manage.py makemigrations orders.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=200,
+            help='Количество пользователей seed_orders.'
+        )
+        parser.add_argument(
+            '--orders', type=int, default=20000,
+            help='Количество заказов seed_orders.'
+        )
+        parser.add_argument(
+            '--items', type=int, default=3,
+            help='Среднее количество товаров в заказе.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=90,
+            help='Количество дней, по которым распределены заказы.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел.'
+        )
+        parser.add_argument(
+            '--upload-size', type=int, default=1000,
+            help='Количество заказов в одной загрузке.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество замеров каждой операции.'
+        )
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Файл результатов предыдущего запуска для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        for option in BENCH_OPTIONS:
+            if option != 'seed' and options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} должно '
+                                   f'быть больше нуля.')
+        run_options = {option: options[option] for option in BENCH_OPTIONS}
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline_report = json.load(file)
+            baseline = {
+                result['name']: result
+                for result in baseline_report['results']
+            }
+            if baseline_report['options'] != run_options:
+                self.stderr.write(
+                    f'Параметры сравниваемого запуска отличаются: '
+                    f'{baseline_report["options"]}.'
+                )
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            if (Order._meta.db_table
+                    not in connection.introspection.table_names()):
+                raise CommandError(
+                    'В тестовой БД нет таблиц заказов: у приложения orders '
+                    'нет миграций. Выполните python manage.py '
+                    'makemigrations orders и повторите запуск.'
+                )
+            started = time.perf_counter()
+            call_command(
+                'seed_orders', users=options['users'],
+                orders=options['orders'], items=options['items'],
+                days=options['days'], seed=options['seed'], verbosity=0
+            )
+            self.stdout.write(
+                f'Тестовая БД заполнена за '
+                f'{time.perf_counter() - started:.1f} с.'
+            )
+            results = [
+                self.measure(name, run, options['repeat'])
+                for name, run in self.get_benchmarks(options)
+            ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for result in results:
+            self.stdout.write(self.format_result(
+                result, baseline and baseline.get(result['name'])
+            ))
+        if options['output']:
+            report = {
+                'started_at': timezone.now().isoformat(),
+                'environment': {
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': connection.vendor,
+                    'platform': platform.platform(),
+                },
+                'options': run_options,
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def get_benchmarks(self, options):
+        """Метод подготовки замеряемых операций.
+
+        Операция принимает номер прогона и возвращает статус ответа.
+        Тела загрузок готовятся заранее, чтобы генерация данных
+        не попадала в замер: каждый прогон upload_create создает
+        новые заказы, прогон upload_update с тем же номером загружает
+        их же с другим содержимым.
+        """
+        client = Client()
+        # Прогонов каждой операции: разогрев, замеры и замер памяти.
+        runs = options['repeat'] + 2
+        generator = OrderGenerator(
+            seed=options['seed'] + 1, items=options['items'],
+            days=options['days']
+        )
+
+        def get_upload_body(run):
+            return json.dumps({
+                'user': 'bench-upload',
+                'orders': [
+                    generator.order(f'bench-order-{run:03d}-{number:06d}')
+                    for number in range(options['upload_size'])
+                ],
+            }, cls=DjangoJSONEncoder)
+
+        create_bodies = [get_upload_body(run) for run in range(runs)]
+        update_bodies = [get_upload_body(run) for run in range(runs)]
+
+        def upload(bodies):
+            def run(index):
+                return client.post(
+                    '/api/orders/upload/', bodies[index],
+                    content_type='application/json'
+                ).status_code
+            return run
+
+        username = UserOrderStats.objects.order_by(
+            '-orders_count'
+        ).values_list('user__username', flat=True).first()
+
+        def user_stats(index):
+            invalidate_user_stats([username])
+            return client.get(
+                '/api/orders/stats/', {'user': username}
+            ).status_code
+
+        date_to = timezone.localdate() - timedelta(days=1)
+        date_from = date_to - timedelta(days=options['days'] - 1)
+
+        def daily_stats(index):
+            return client.get('/api/daily-stats/daily_stats/', {
+                'from': date_from.isoformat(), 'to': date_to.isoformat(),
+            }).status_code
+
+        def daily_order_stats_task(index):
+            daily_order_stats()
+            return 'ok'
+
+        return (
+            ('upload_create', upload(create_bodies)),
+            ('upload_update', upload(update_bodies)),
+            ('user_stats', user_stats),
+            ('daily_stats', daily_stats),
+            ('daily_order_stats', daily_order_stats_task),
+        )
+
+    @staticmethod
+    def measure(name, run, repeat):
+        """Метод замера операции.
+
+        Первый прогон - разогрев, затем repeat замеров времени
+        и отдельный прогон с подсчетом SQL-запросов и пиковой памяти,
+        чтобы их учет не влиял на время.
+        """
+        run(0)
+        timings = []
+        for index in range(1, repeat + 1):
+            started = time.perf_counter()
+            status = run(index)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            run(repeat + 1)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'name': name,
+            'status': status,
+            'repeat': repeat,
+            'mean_ms': round(statistics.mean(timings), 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': len(queries),
+            'peak_memory_kb': round(peak_memory / 1024),
+        }
+
+    @staticmethod
+    def format_result(result, baseline=None):
+        """Метод форматирования результата замера операции."""
+        line = (
+            f'{result["name"]:<18} медиана {result["median_ms"]:>9.1f} мс '
+            f'(мин. {result["min_ms"]:.1f}, макс. {result["max_ms"]:.1f}), '
+            f'SQL: {result["queries"]}, '
+            f'память: {result["peak_memory_kb"]} КБ, '
+            f'статус: {result["status"]}'
+        )
+        if baseline is None:
+            return line
+        change = (result['median_ms'] / baseline['median_ms'] - 1) * 100
+        return (
+            f'{line}\n{"":<18} было {baseline["median_ms"]:.1f} мс '
+            f'({change:+.1f}%), SQL: {baseline["queries"]}, '
+            f'память: {baseline["peak_memory_kb"]} КБ'
+        )
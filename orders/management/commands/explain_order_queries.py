@@ -0,0 +1,156 @@
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, User
+
+
+class Command(BaseCommand):
+    """Планы выполнения и время горячих запросов к заказам."""
+
+    help = (
+        'Выводит EXPLAIN и медианное время запросов статистики '
+        '(user_stats, daily_order_stats) и выборок заказов. С --compare '
+        'сначала замеряет запросы без индексов Order/OrderItem (индексы '
+        'удаляются в транзакции, которая затем откатывается; на PostgreSQL '
+        'это блокирует таблицы - запускайте на стенде), затем с ними.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Пользователь для user_stats (по умолчанию - автор '
+                 'последнего заказа).'
+        )
+        parser.add_argument(
+            '--date', type=date.fromisoformat,
+            help='День для daily_order_stats в формате YYYY-MM-DD '
+                 '(по умолчанию - вчера).'
+        )
+        parser.add_argument(
+            '--runs', type=int, default=5,
+            help='Количество замеров каждого запроса.'
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='EXPLAIN ANALYZE (только PostgreSQL).'
+        )
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Замерить запросы без индексов и с индексами.'
+        )
+
+    def handle(self, *args, **options):
+        if options['analyze'] and connection.vendor != 'postgresql':
+            raise CommandError('--analyze поддерживается только PostgreSQL.')
+
+        cases = self.get_cases(options)
+        if options['compare']:
+            with transaction.atomic():
+                self.drop_indexes()
+                self.run_cases('Без индексов', cases, options)
+                transaction.set_rollback(True)
+        self.run_cases('С индексами', cases, options)
+
+    def get_cases(self, options):
+        """Метод сборки проверяемых запросов."""
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {options["user"]} не найден.'
+                )
+            user_id = user.pk
+        else:
+            user_id = Order.objects.order_by('-created_at').values_list(
+                'user_id', flat=True
+            ).first()
+            if user_id is None:
+                raise CommandError('В базе нет заказов.')
+
+        stats_date = options['date'] or (
+            timezone.now().date() - timedelta(days=1)
+        )
+        day_range = (
+            timezone.make_aware(
+                datetime.combine(stats_date, datetime.min.time())
+            ),
+            timezone.make_aware(
+                datetime.combine(stats_date, datetime.max.time())
+            )
+        )
+        stats = {
+            'orders_count': Count('id'),
+            'total_revenue': Sum('total_amount'),
+            'avg_order_value': Avg('total_amount'),
+        }
+        user_orders = Order.objects.filter(user_id=user_id).order_by()
+        day_orders = Order.objects.filter(
+            created_at__range=day_range
+        ).order_by()
+        daily_stats = day_orders.annotate(
+            day=TruncDate('created_at')
+        ).values('day').annotate(
+            total_users=Count('user', distinct=True), **stats
+        )
+        last_orders = Order.objects.order_by('-created_at')[:100]
+        sku = OrderItem.objects.values_list('sku', flat=True).first()
+        sku_items = OrderItem.objects.filter(sku=sku).order_by()
+
+        # Для EXPLAIN агрегата user_stats используется эквивалентный
+        # запрос с группировкой, т.к. aggregate() сразу выполняет запрос.
+        return (
+            ('user_stats',
+             user_orders.values('user_id').annotate(**stats),
+             lambda: user_orders.aggregate(**stats)),
+            ('daily_order_stats',
+             daily_stats,
+             lambda: list(daily_stats.all())),
+            ('orders_by_created_at',
+             last_orders,
+             lambda: list(last_orders.all())),
+            ('items_by_sku',
+             sku_items,
+             lambda: list(sku_items[:100])),
+        )
+
+    def drop_indexes(self):
+        """Метод удаления индексов Order и OrderItem в текущей транзакции."""
+        schema_editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in (Order, OrderItem):
+                existing = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table
+                )
+                for index in model._meta.indexes:
+                    if index.name not in existing:
+                        self.stderr.write(
+                            f'Индекс {index.name} отсутствует в БД, '
+                            f'примените миграции.'
+                        )
+                        continue
+                    cursor.execute(
+                        str(index.remove_sql(model, schema_editor))
+                    )
+
+    def run_cases(self, title, cases, options):
+        """Метод вывода планов и замеров времени запросов."""
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {title} =='))
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        for name, queryset, execute in cases:
+            timings = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                execute()
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: медиана {statistics.median(timings):.2f} мс, '
+                f'минимум {min(timings):.2f} мс ({options["runs"]} замеров)'
+            ))
+            self.stdout.write(queryset.explain(**explain_options))
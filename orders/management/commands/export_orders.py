@@ -0,0 +1,99 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from orders.export import EXPORT_FORMATS, export_orders
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    """Выгрузка заказов с товарами в файл."""
+
+    help = (
+        'Выгружает заказы с товарами в CSV или Parquet (строка на товар) '
+        'либо NDJSON (строка на заказ). Заказы читаются пачками '
+        'по ключу id, объем памяти не зависит от объема выгрузки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', dest='export_format', choices=EXPORT_FORMATS,
+            default='csv', help='Формат файла.'
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Путь к файлу (по умолчанию - stdout).'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int,
+            default=settings.ORDERS_EXPORT_CHUNK_SIZE,
+            help='Количество заказов в пачке.'
+        )
+        parser.add_argument('--user', help='Только заказы пользователя.')
+        parser.add_argument('--status', help='Только заказы в статусе.')
+        parser.add_argument(
+            '--created-after', type=self.parse_datetime,
+            help='Заказы, созданные не раньше (ISO 8601).'
+        )
+        parser.add_argument(
+            '--created-before', type=self.parse_datetime,
+            help='Заказы, созданные не позже (ISO 8601).'
+        )
+
+    @staticmethod
+    def parse_datetime(value):
+        """Метод разбора даты и времени аргумента."""
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(value)
+        return parsed
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['user']:
+            orders = orders.filter(user__username=options['user'])
+        if options['status']:
+            orders = orders.filter(status=options['status'])
+        if options['created_after']:
+            orders = orders.filter(created_at__gte=options['created_after'])
+        if options['created_before']:
+            orders = orders.filter(
+                created_at__lte=options['created_before']
+            )
+
+        try:
+            content = export_orders(
+                orders, options['export_format'], options['chunk_size']
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        binary = options['export_format'] == 'parquet'
+        if options['output'] == '-':
+            output = sys.stdout.buffer if binary else sys.stdout
+            close = False
+        else:
+            output = open(
+                options['output'], 'wb' if binary else 'w',
+                **({} if binary else {'encoding': 'utf-8', 'newline': ''})
+            )
+            close = True
+
+        started = time.perf_counter()
+        written = 0
+        try:
+            for data in content:
+                output.write(data)
+                written += len(data)
+        finally:
+            if close:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгрузка завершена: {written} '
+            f'{"байт" if binary else "символов"} за '
+            f'{time.perf_counter() - started:.1f} с.'
+        ))
@@ -0,0 +1,143 @@
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.importer import (IMPORT_FORMATS, READERS, OrderImportValidator,
+                             get_import_format, get_order_loader,
+                             open_import_file)
+from orders.services import iter_chunks
+
+
+class Command(BaseCommand):
+    """Импорт заказов из файла."""
+
+    help = (
+        'Импортирует заказы из CSV (формат export_orders: строка '
+        'на товар) или NDJSON (строка на заказ), в том числе .gz. '
+        'Файл читается потоково, заказы проверяются по правилам загрузки '
+        'и записываются пачками: на PostgreSQL - через COPY '
+        'в промежуточные таблицы, на других СУБД - через bulk-операции. '
+        'После каждой пачки сохраняется контрольная точка, повторный '
+        'запуск продолжает импорт с нее.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу импорта.')
+        parser.add_argument(
+            '--format', dest='import_format', choices=IMPORT_FORMATS,
+            help='Формат файла (по умолчанию - по расширению).'
+        )
+        parser.add_argument(
+            '--user',
+            help='Пользователь всех заказов (вместо поля user файла).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.ORDERS_UPLOAD_BATCH_SIZE,
+            help='Количество заказов в пачке.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию - <path>.checkpoint).'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать импорт заново, игнорируя контрольную точку.'
+        )
+        parser.add_argument(
+            '--max-errors', type=int,
+            default=settings.ORDERS_UPLOAD_STREAM_MAX_ERRORS,
+            help='Количество выводимых ошибок валидации.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['import_format'] or get_import_format(path)
+        if import_format is None:
+            raise CommandError('Не удалось определить формат файла, '
+                               'укажите --format.')
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        skip = 0 if options['restart'] else self.read_checkpoint(
+            checkpoint_path, path
+        )
+        if skip:
+            self.stdout.write(f'Продолжение импорта с записи {skip + 1}.')
+
+        validator = OrderImportValidator(
+            options['max_errors'], default_user=options['user']
+        )
+        loader = get_order_loader()
+        processed = skip
+        orders_count = items_count = 0
+        started = time.perf_counter()
+
+        with open_import_file(path) as stream:
+            records = islice(READERS[import_format](stream), skip, None)
+            for batch in iter_chunks(records, options['batch_size']):
+                orders = list(validator(batch))
+                if orders:
+                    items_count += loader.load(orders)
+                orders_count += len(orders)
+                processed += len(batch)
+                self.write_checkpoint(checkpoint_path, path, processed)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'Записей: {processed}, валидных заказов: '
+                    f'{orders_count} ({orders_count / elapsed:.0f}/с), '
+                    f'товаров: {items_count} '
+                    f'({items_count / elapsed:.0f}/с), '
+                    f'ошибок: {validator.invalid_lines}.'
+                )
+
+        loader.finish()
+        os.remove(checkpoint_path)
+
+        for error in validator.errors:
+            self.stderr.write(
+                f'Строка {error["line"]}: {error["errors"]}'
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен за {elapsed:.1f} с: заказов {orders_count} '
+            f'({orders_count / elapsed:.0f}/с), товаров {items_count} '
+            f'({items_count / elapsed:.0f}/с), ошибок '
+            f'{validator.invalid_lines}.'
+        ))
+
+    @staticmethod
+    def read_checkpoint(checkpoint_path, path):
+        """Метод чтения количества обработанных записей из контрольной
+        точки.
+        """
+        try:
+            with open(checkpoint_path, encoding='utf-8') as file:
+                checkpoint = json.load(file)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            raise CommandError(f'Контрольная точка {checkpoint_path} '
+                               f'повреждена, используйте --restart.')
+        if checkpoint.get('path') != os.path.abspath(path):
+            raise CommandError(f'Контрольная точка {checkpoint_path} '
+                               f'относится к другому файлу.')
+        return checkpoint['records']
+
+    @staticmethod
+    def write_checkpoint(checkpoint_path, path, records):
+        """Метод атомарной записи контрольной точки."""
+        temporary_path = f'{checkpoint_path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'path': os.path.abspath(path), 'records': records}, file
+            )
+        os.replace(temporary_path, checkpoint_path)
@@ -0,0 +1,116 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from orders.cache import invalidate_user_stats
+from orders.models import Order, User, UserOrderStats
+from orders.services import iter_chunks
+
+
+class Command(BaseCommand):
+    """Сверка и перестроение статистики заказов пользователей."""
+
+    help = (
+        'Пересчитывает UserOrderStats по таблице заказов одним запросом '
+        'с группировкой по пользователю и исправляет расхождения. '
+        'Статистика пользователей с расхождениями пересчитывается '
+        'повторно под блокировкой их строк UserOrderStats, чтобы '
+        'не перезаписать изменения параллельной загрузки. С --check '
+        'только сообщает о расхождениях (код выхода 1, если они есть).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить расхождения, ничего не записывая.'
+        )
+
+    def handle(self, *args, **options):
+        actual = {
+            row['user_id']: (row['orders_count'], row['total_revenue'])
+            for row in Order.objects.order_by().values('user_id').annotate(
+                orders_count=Count('id'),
+                total_revenue=Sum('total_amount')
+            )
+        }
+        stored = {
+            user_id: (orders_count, total_revenue)
+            for user_id, orders_count, total_revenue
+            in UserOrderStats.objects.values_list(
+                'user_id', 'orders_count', 'total_revenue'
+            )
+        }
+        empty = (0, Decimal('0'))
+        drift = {
+            user_id: actual.get(user_id, empty)
+            for user_id in actual.keys() | stored.keys()
+            if actual.get(user_id, empty) != stored.get(user_id, empty)
+        }
+
+        self.stdout.write(
+            f'Пользователей с заказами: {len(actual)}, '
+            f'записей статистики: {len(stored)}, '
+            f'расхождений: {len(drift)}.'
+        )
+        for user_id in sorted(drift)[:20]:
+            self.stdout.write(
+                f'  user_id={user_id}: в таблице '
+                f'{stored.get(user_id, empty)}, по заказам {drift[user_id]}'
+            )
+
+        if options['check']:
+            if drift:
+                raise CommandError('Статистика пользователей расходится '
+                                   'с заказами.', returncode=1)
+            return
+        if not drift:
+            return
+
+        for user_ids in iter_chunks(
+            sorted(drift), settings.ORDERS_UPLOAD_BATCH_SIZE
+        ):
+            self.rebuild(user_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлена статистика {len(drift)} пользователей.'
+        ))
+
+    @staticmethod
+    def rebuild(user_ids):
+        """Метод пересчета статистики пачки пользователей.
+
+        Строки статистики блокируются до пересчета: загрузка, которая
+        успела изменить строку, зафиксируется раньше и попадет
+        в агрегат, а следующая применит свою разницу к пересчитанному
+        значению.
+        """
+        with transaction.atomic():
+            list(UserOrderStats.objects.select_for_update().filter(
+                user_id__in=user_ids
+            ).order_by('user_id').values_list('user_id', flat=True))
+            actual = {
+                row['user_id']: (row['orders_count'], row['total_revenue'])
+                for row in Order.objects.filter(
+                    user_id__in=user_ids
+                ).order_by().values('user_id').annotate(
+                    orders_count=Count('id'),
+                    total_revenue=Sum('total_amount')
+                )
+            }
+            empty = (0, Decimal('0'))
+            UserOrderStats.objects.bulk_create(
+                [UserOrderStats(user_id=user_id,
+                                orders_count=actual.get(user_id, empty)[0],
+                                total_revenue=actual.get(user_id, empty)[1])
+                 for user_id in user_ids],
+                update_conflicts=True,
+                unique_fields=('user',),
+                update_fields=('orders_count', 'total_revenue')
+            )
+            usernames = set(User.objects.filter(
+                id__in=user_ids
+            ).values_list('username', flat=True))
+            transaction.on_commit(lambda: invalidate_user_stats(usernames))
@@ -0,0 +1,190 @@
+import io
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, User
+from orders.seed import OrderGenerator
+from orders.services import get_order_hash, iter_chunks
+from orders.stats import iter_date_ranges, rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    """Генерация синтетических заказов."""
+
+    help = (
+        'Создает --users пользователей и --orders заказов в среднем '
+        'по --items товаров: заказы распределены по пользователям '
+        'с тяжелым хвостом (Парето), даты - за --days дней до --to. '
+        'Заказы записываются bulk-операциями пачками по --batch-size, '
+        'после чего пересчитывается статистика пользователей и дней. '
+        'При одинаковых параметрах (включая --to) и --seed данные '
+        'одинаковы; повторный запуск добавляет заказы с новыми номерами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей.'
+        )
+        parser.add_argument(
+            '--orders', type=int, default=100000,
+            help='Количество заказов.'
+        )
+        parser.add_argument(
+            '--items', type=int, default=3,
+            help='Среднее количество товаров в заказе.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Количество дней, по которым распределены заказы.'
+        )
+        parser.add_argument(
+            '--to', dest='date_to', type=date.fromisoformat,
+            help='Последний день заказов в формате YYYY-MM-DD '
+                 '(по умолчанию - вчера).'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.2,
+            help='Параметр распределения Парето заказов по пользователям '
+                 '(меньше - тяжелее хвост).'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел.'
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имен пользователей и номеров заказов.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.ORDERS_UPLOAD_BATCH_SIZE,
+            help='Количество заказов в пачке.'
+        )
+
+    def handle(self, *args, **options):
+        for option in ('users', 'items', 'days', 'batch_size'):
+            if options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} должно '
+                                   f'быть больше нуля.')
+        if options['orders'] < 0 or options['skew'] <= 0:
+            raise CommandError('--orders не может быть отрицательным, '
+                               '--skew должен быть больше нуля.')
+        started = time.perf_counter()
+        prefix = options['prefix']
+        generator = OrderGenerator(
+            seed=options['seed'], items=options['items'],
+            days=options['days'], date_to=options['date_to'],
+            skew=options['skew']
+        )
+
+        users = self.get_users(
+            prefix, options['users'], options['batch_size']
+        )
+        user_weights = generator.get_weights(len(users))
+        first_number = Order.objects.filter(
+            order_number__startswith=f'{prefix}-order-'
+        ).count()
+
+        orders_count = items_count = 0
+        created_from = created_to = None
+        for numbers in iter_chunks(
+            range(first_number, first_number + options['orders']),
+            options['batch_size']
+        ):
+            orders = []
+            items = []
+            for number, user in zip(numbers, generator.choose(
+                users, user_weights, len(numbers)
+            )):
+                order_data = generator.order(f'{prefix}-order-{number:09d}')
+                order = Order(
+                    user=user,
+                    order_number=order_data['order_number'],
+                    created_at=order_data['created_at'],
+                    total_amount=order_data['total_amount'],
+                    status=order_data['status'],
+                    content_hash=get_order_hash(user.username, order_data)
+                )
+                orders.append(order)
+                items.extend(
+                    OrderItem(order=order, **item_data)
+                    for item_data in order_data['items']
+                )
+            with transaction.atomic():
+                self.create_orders(orders)
+                OrderItem.objects.bulk_create(
+                    items, batch_size=options['batch_size']
+                )
+
+            orders_count += len(orders)
+            items_count += len(items)
+            batch_from = min(order.created_at for order in orders)
+            batch_to = max(order.created_at for order in orders)
+            created_from = min(created_from or batch_from, batch_from)
+            created_to = max(created_to or batch_to, batch_to)
+            if options['verbosity']:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'Записано заказов: {orders_count} из '
+                    f'{options["orders"]} '
+                    f'({orders_count / elapsed:.0f} заказов/с).'
+                )
+
+        call_command(
+            'rebuild_user_stats',
+            stdout=self.stdout if options['verbosity'] else io.StringIO()
+        )
+        if created_from is not None:
+            for date_from, date_to in iter_date_ranges(
+                timezone.localdate(created_from),
+                timezone.localdate(created_to), 31
+            ):
+                rebuild_daily_stats(date_from, date_to)
+
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Создано пользователей: {len(users)}, заказов: '
+                f'{orders_count}, товаров: {items_count} за '
+                f'{time.perf_counter() - started:.1f} с.'
+            ))
+
+    @staticmethod
+    def get_users(prefix, count, batch_size):
+        """Метод создания пользователей, возвращает их в порядке имен."""
+        usernames = [f'{prefix}-user-{index:06d}' for index in range(count)]
+        User.objects.bulk_create(
+            [User(username=username) for username in usernames],
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        users = {
+            user.username: user
+            for user in User.objects.filter(
+                username__startswith=f'{prefix}-user-'
+            ).only('id', 'username')
+        }
+        return [users[username] for username in usernames]
+
+    @staticmethod
+    def create_orders(orders):
+        """Метод записи пачки заказов с получением их первичных ключей.
+
+        На СУБД без RETURNING в bulk_create первичные ключи дочитываются
+        одним запросом по номерам заказов.
+        """
+        Order.objects.bulk_create(orders, batch_size=len(orders))
+        orders_without_pk = {
+            order.order_number: order for order in orders if order.pk is None
+        }
+        if orders_without_pk:
+            for order_number, order_id in Order.objects.filter(
+                order_number__in=orders_without_pk
+            ).values_list('order_number', 'id'):
+                orders_without_pk[order_number].pk = order_id
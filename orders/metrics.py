@@ -0,0 +1,219 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Границы корзин гистограммы времени запроса (секунды).
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Замеры текущего запроса. Контекст копируется в потоки sync_to_async,
+# поэтому SQL-запросы асинхронных представлений попадают в замеры
+# своего запроса.
+current_metrics = ContextVar('orders_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Замеры одного запроса к API.
+
+    Число и время SQL-запросов учитывает record_query. Текст запросов
+    сохраняется (не более ORDERS_SLOW_REQUEST_MAX_QUERIES) для журнала
+    медленных запросов.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.queries = []
+        self.view_started = None
+        self.view_finished = None
+        self.render_finished = None
+        self.total_time = None
+
+    def add_query(self, duration, sql, params):
+        """Метод учета выполненного SQL-запроса."""
+        self.db_queries += 1
+        self.db_time += duration
+        if len(self.queries) < settings.ORDERS_SLOW_REQUEST_MAX_QUERIES:
+            self.queries.append((duration, sql, params))
+
+    def start_view(self):
+        """Метод отметки начала выполнения представления."""
+        self.view_started = time.perf_counter()
+
+    def finish_view(self):
+        """Метод отметки окончания выполнения представления."""
+        self.view_finished = time.perf_counter()
+
+    def finish_render(self, response):
+        """Метод отметки окончания рендеринга ответа (post-render)."""
+        self.render_finished = time.perf_counter()
+
+    def finish(self):
+        """Метод отметки окончания обработки запроса.
+
+        Для ответов без рендеринга (HttpResponse, потоковые) окончанием
+        представления считается окончание обработки.
+        """
+        finished = time.perf_counter()
+        if self.view_started is not None and self.view_finished is None:
+            self.view_finished = finished
+        self.total_time = finished - self.started
+
+    @property
+    def render_time(self):
+        """Время сериализации ответа рендерером DRF."""
+        if self.view_finished is None or self.render_finished is None:
+            return 0.0
+        return self.render_finished - self.view_finished
+
+    @property
+    def view_time(self):
+        """Время выполнения представления (вместе с SQL)."""
+        if self.view_started is None or self.view_finished is None:
+            return 0.0
+        return self.view_finished - self.view_started
+
+    def server_timing(self):
+        """Метод получения значения заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.db_queries} queries"',
+            f'view;dur={self.view_time * 1000:.1f}',
+            f'serialize;dur={self.render_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+
+def record_query(execute, sql, params, many, context):
+    """Функция-обертка (execute wrapper) замера SQL-запроса.
+
+    Учитывает запрос в замерах текущего запроса к API, вне запроса
+    только выполняет его.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - started, sql, params)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Функция подключения record_query к новому соединению с БД.
+
+    Обработчик сигнала connection_created. Соединения Django
+    принадлежат потоку, поэтому обертка ставится на каждое
+    соединение один раз и работает во всех его запросах.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsRegistry:
+    """Накопительные метрики запросов к API в памяти процесса.
+
+    Метрики группируются по методу, имени маршрута и статусу ответа
+    и отдаются в текстовом формате Prometheus. Каждый процесс
+    (воркер) копит свои значения, сборщик различает их по instance.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = defaultdict(
+            lambda: {
+                'requests': 0,
+                'duration': 0.0,
+                'db_queries': 0,
+                'db_duration': 0.0,
+                'serialize_duration': 0.0,
+                'buckets': [0] * len(DURATION_BUCKETS),
+            }
+        )
+
+    def observe(self, method, route, status_code, metrics):
+        """Метод учета замеров завершенного запроса."""
+        bucket = bisect_left(DURATION_BUCKETS, metrics.total_time)
+        with self.lock:
+            series = self.series[method, route, str(status_code)]
+            series['requests'] += 1
+            series['duration'] += metrics.total_time
+            series['db_queries'] += metrics.db_queries
+            series['db_duration'] += metrics.db_time
+            series['serialize_duration'] += metrics.render_time
+            if bucket < len(DURATION_BUCKETS):
+                series['buckets'][bucket] += 1
+
+    def render(self):
+        """Метод вывода метрик в текстовом формате Prometheus."""
+        with self.lock:
+            series = {
+                labels: {**values, 'buckets': list(values['buckets'])}
+                for labels, values in self.series.items()
+            }
+        lines = []
+
+        def add(name, metric_type, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.extend(samples)
+
+        def labels(method, route, status_code, **extra):
+            pairs = {'method': method, 'route': route,
+                     'status': status_code, **extra}
+            return ','.join(f'{key}="{value}"' for key, value in pairs.items())
+
+        add('orders_http_requests_total', 'counter',
+            'Number of API requests.',
+            [f'orders_http_requests_total{{{labels(*key)}}} '
+             f'{values["requests"]}' for key, values in series.items()])
+
+        histogram = []
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, values['buckets']):
+                cumulative += count
+                histogram.append(
+                    f'orders_http_request_duration_seconds_bucket'
+                    f'{{{labels(*key, le=bound)}}} {cumulative}'
+                )
+            histogram.append(
+                f'orders_http_request_duration_seconds_bucket'
+                f'{{{labels(*key, le="+Inf")}}} {values["requests"]}'
+            )
+            histogram.append(
+                f'orders_http_request_duration_seconds_sum'
+                f'{{{labels(*key)}}} {values["duration"]:.6f}'
+            )
+            histogram.append(
+                f'orders_http_request_duration_seconds_count'
+                f'{{{labels(*key)}}} {values["requests"]}'
+            )
+        add('orders_http_request_duration_seconds', 'histogram',
+            'API request latency.', histogram)
+
+        for name, field, help_text, number_format in (
+            ('orders_http_db_queries_total', 'db_queries',
+             'SQL queries executed by API requests.', 'd'),
+            ('orders_http_db_duration_seconds_total', 'db_duration',
+             'Time spent in SQL queries by API requests.', '.6f'),
+            ('orders_http_serialize_duration_seconds_total',
+             'serialize_duration',
+             'Time spent rendering API responses.', '.6f'),
+        ):
+            add(name, 'counter', help_text, [
+                f'{name}{{{labels(*key)}}} '
+                f'{values[field]:{number_format}}'
+                for key, values in series.items()
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
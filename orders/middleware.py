@@ -0,0 +1,113 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .log import Truncated
+from .metrics import RequestMetrics, current_metrics, registry
+
+logger = logging.getLogger('orders')
+
+REQUEST_SUMMARY = ('%s %s %s: %.1f мс, SQL-запросов %s (%.1f мс), '
+                   'сериализация %.1f мс.')
+
+
+class RequestMetricsMiddleware:
+    """Middleware замеров запросов к API.
+
+    На время запроса его замеры становятся текущими (current_metrics),
+    и execute wrapper соединений с БД учитывает в них SQL-запросы
+    и их время. По итогам
+    запроса замеры пишутся в журнал orders, в заголовок Server-Timing
+    и в метрики /api/metrics/; для запросов дольше
+    ORDERS_SLOW_REQUEST_MS в журнал выводятся их SQL-запросы.
+
+    Для потоковых ответов замеряется время до начала отдачи тела.
+    Middleware работает и в синхронной, и в асинхронной цепочке (ASGI),
+    чтобы не переводить асинхронные представления в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ORDERS_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not request.path.startswith(settings.ORDERS_METRICS_PATH_PREFIX):
+            return self.get_response(request)
+
+        metrics = request.orders_metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish_request(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not request.path.startswith(settings.ORDERS_METRICS_PATH_PREFIX):
+            return await self.get_response(request)
+
+        metrics = request.orders_metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish_request(request, response, metrics)
+
+    def finish_request(self, request, response, metrics):
+        """Метод учета замеров завершенного запроса."""
+        metrics.finish()
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        registry.observe(request.method, route, response.status_code, metrics)
+        response['Server-Timing'] = metrics.server_timing()
+        self.log_request(request, response, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Метод отметки начала выполнения представления."""
+        metrics = getattr(request, 'orders_metrics', None)
+        if metrics is not None:
+            metrics.start_view()
+
+    def process_template_response(self, request, response):
+        """Метод замера рендеринга ответа DRF.
+
+        Вызывается сразу после представления и до рендеринга ответа,
+        окончание рендеринга отмечается post-render callback.
+        """
+        metrics = getattr(request, 'orders_metrics', None)
+        if metrics is not None:
+            metrics.finish_view()
+            response.add_post_render_callback(metrics.finish_render)
+        return response
+
+    @staticmethod
+    def log_request(request, response, metrics):
+        """Метод записи замеров запроса в журнал."""
+        args = (
+            request.method, request.get_full_path(), response.status_code,
+            metrics.total_time * 1000, metrics.db_queries,
+            metrics.db_time * 1000, metrics.render_time * 1000
+        )
+        if metrics.total_time * 1000 < settings.ORDERS_SLOW_REQUEST_MS:
+            logger.info(REQUEST_SUMMARY, *args)
+            return
+        queries = '\n'.join(
+            f'  {duration * 1000:.1f} мс: {Truncated(sql)} {Truncated(params)}'
+            for duration, sql, params in metrics.queries
+        )
+        logger.warning(
+            'Медленный запрос ' + REQUEST_SUMMARY + '\n%s', *args, queries
+        )
@@ -1,3 +1,4 @@
+import uuid
 from decimal import Decimal
 
 from django.db import models
@@ -49,11 +50,33 @@ class Order(models.Model):
         verbose_name='Статус заказа',
         max_length=OrderConstants.MAX_STATUS_LENGTH
     )
+    content_hash = models.CharField(
+        verbose_name='Хеш содержимого заказа',
+        max_length=OrderConstants.CONTENT_HASH_LENGTH,
+        blank=True,
+        default=''
+    )
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ('created_at',)
+        indexes = (
+            # Статистика пользователя и его заказы по ключу
+            # пагинации (created_at, id).
+            models.Index(
+                fields=('user', 'created_at', 'id'),
+                name='order_user_created_at_idx'
+            ),
+            # Ежедневная статистика по диапазону created_at, сортировка
+            # по умолчанию и пагинация по (created_at, id); на PostgreSQL
+            # индекс покрывающий.
+            models.Index(
+                fields=('created_at', 'id'),
+                include=('total_amount', 'user'),
+                name='order_created_at_idx'
+            ),
+        )
 
     def __str__(self):
         return f'Пользователь {self.user} сделал заказ № {self.order_number}'
@@ -86,11 +109,54 @@ class OrderItem(models.Model):
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ('name',)
+        indexes = (
+            models.Index(fields=('sku',), name='orderitem_sku_idx'),
+        )
 
     def __str__(self):
         return self.name
 
 
+class UserOrderStats(models.Model):
+    """Модель UserOrderStats (агрегированная статистика пользователя).
+
+    Поддерживается при загрузке заказов, сверяется и перестраивается
+    командой rebuild_user_stats.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Пользователь',
+        related_name='order_stats'
+    )
+    orders_count = models.PositiveIntegerField(
+        verbose_name='Количество заказов',
+        default=0
+    )
+    total_revenue = models.DecimalField(
+        verbose_name='Общая выручка',
+        max_digits=OrderConstants.MAX_TOTAL_AMOUNT,
+        decimal_places=OrderConstants.MAX_DECIMAL_PLACES,
+        default=Decimal('0')
+    )
+
+    class Meta:
+        verbose_name = 'Статистика заказов пользователя'
+        verbose_name_plural = 'Статистика заказов пользователей'
+
+    def __str__(self):
+        return f'Статистика заказов {self.user}'
+
+    @property
+    def avg_order_value(self):
+        """Средний чек пользователя."""
+        if not self.orders_count:
+            return Decimal('0')
+        return self.total_revenue / self.orders_count
+
+
 class DailyOrderStats(models.Model):
     """Модель DailyOrderStats (хранения ежедневной статистики заказов)."""
 
@@ -122,6 +188,11 @@ class DailyOrderStats(models.Model):
         verbose_name='Дата создания',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Ежедневная статистика заказов'
@@ -130,3 +201,211 @@ class DailyOrderStats(models.Model):
 
     def __str__(self):
         return f'Статистика за {self.date}'
+
+
+class RollupGrain(models.TextChoices):
+    """Гранулярность интервалов временных рядов заказов."""
+
+    HOUR = 'hour', 'Час'
+    DAY = 'day', 'День'
+
+
+class OrderRollup(models.Model):
+    """Абстрактная модель интервала временного ряда заказов."""
+
+    grain = models.CharField(
+        verbose_name='Гранулярность',
+        max_length=OrderConstants.MAX_STATUS_LENGTH,
+        choices=RollupGrain.choices
+    )
+    bucket = models.DateTimeField(
+        verbose_name='Начало интервала'
+    )
+    orders_count = models.PositiveIntegerField(
+        verbose_name='Количество заказов',
+        default=0
+    )
+    total_revenue = models.DecimalField(
+        verbose_name='Общая выручка',
+        max_digits=OrderConstants.MAX_TOTAL_AMOUNT,
+        decimal_places=OrderConstants.MAX_DECIMAL_PLACES,
+        default=Decimal('0')
+    )
+
+    class Meta:
+        abstract = True
+        ordering = ('bucket',)
+
+
+class OrderStatusRollup(OrderRollup):
+    """Модель OrderStatusRollup (заказы за интервал по статусу)."""
+
+    status = models.CharField(
+        verbose_name='Статус заказа',
+        max_length=OrderConstants.MAX_STATUS_LENGTH
+    )
+
+    class Meta(OrderRollup.Meta):
+        verbose_name = 'Заказы за интервал по статусу'
+        verbose_name_plural = 'Заказы за интервалы по статусам'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('grain', 'bucket', 'status'),
+                name='order_status_rollup_unique'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.bucket} ({self.grain}), {self.status}'
+
+
+class OrderUserRollup(OrderRollup):
+    """Модель OrderUserRollup (заказы за интервал по пользователю)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='order_rollups'
+    )
+
+    class Meta(OrderRollup.Meta):
+        verbose_name = 'Заказы за интервал по пользователю'
+        verbose_name_plural = 'Заказы за интервалы по пользователям'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('grain', 'bucket', 'user'),
+                name='order_user_rollup_unique'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.bucket} ({self.grain}), {self.user}'
+
+
+class DailyUserActivity(models.Model):
+    """Модель DailyUserActivity (количество заказов пользователя за день).
+
+    Нужна для подсчета активных пользователей в ежедневной статистике,
+    которая обновляется при загрузке заказов.
+    """
+
+    date = models.DateField(
+        verbose_name='Дата'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='daily_activity'
+    )
+    orders_count = models.PositiveIntegerField(
+        verbose_name='Количество заказов',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Активность пользователя за день'
+        verbose_name_plural = 'Активность пользователей по дням'
+        ordering = ('date',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('date', 'user'),
+                name='daily_user_activity_unique'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} за {self.date}: {self.orders_count}'
+
+
+class DailyStatsDirtyDate(models.Model):
+    """Модель DailyStatsDirtyDate (день, статистику которого нужно
+    пересчитать).
+
+    Отмечается при загрузке заказов за этот день, снимается после
+    пересчета DailyOrderStats.
+    """
+
+    date = models.DateField(
+        verbose_name='Дата статистики',
+        unique=True
+    )
+    marked_at = models.DateTimeField(
+        verbose_name='Дата отметки'
+    )
+
+    class Meta:
+        verbose_name = 'День для пересчета статистики'
+        verbose_name_plural = 'Дни для пересчета статистики'
+        ordering = ('date',)
+
+    def __str__(self):
+        return f'Пересчет статистики за {self.date}'
+
+
+class UploadJob(models.Model):
+    """Модель UploadJob (Задача асинхронной загрузки заказов)."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Завершена'
+        FAILED = 'failed', 'Ошибка'
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    status = models.CharField(
+        verbose_name='Статус задачи',
+        max_length=OrderConstants.MAX_STATUS_LENGTH,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    payload = models.JSONField(
+        verbose_name='Данные загрузки',
+        null=True,
+        blank=True
+    )
+    total_orders = models.PositiveIntegerField(
+        verbose_name='Всего заказов',
+        default=0
+    )
+    processed_orders = models.PositiveIntegerField(
+        verbose_name='Обработано заказов',
+        default=0
+    )
+    statistics = models.JSONField(
+        verbose_name='Статистика загрузки',
+        default=dict,
+        blank=True
+    )
+    errors = models.JSONField(
+        verbose_name='Ошибки',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True
+    )
+    started_at = models.DateTimeField(
+        verbose_name='Дата начала обработки',
+        null=True,
+        blank=True
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Дата завершения обработки',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Задача загрузки заказов'
+        verbose_name_plural = 'Задачи загрузки заказов'
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'Загрузка {self.id} ({self.status})'
@@ -0,0 +1,174 @@
+from base64 import b64decode, b64encode
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class DailyStatsPagination(CursorPagination):
+    """Пагинация ежедневной статистики курсором по дате (keyset)."""
+
+    ordering = '-date'
+    page_size = settings.ORDERS_DAILY_STATS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.ORDERS_DAILY_STATS_MAX_PAGE_SIZE
+
+
+class OrderKeysetPagination(BasePagination):
+    """Пагинация заказов по ключу (created_at, id).
+
+    Страница выбирается условием по ключу последнего заказа предыдущей
+    страницы, без OFFSET и подсчета строк, поэтому стоимость страницы
+    не зависит от ее глубины. Курсор непрозрачен для клиента, переход
+    возможен только вперед по ссылке next.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = settings.ORDERS_LIST_PAGE_SIZE
+    max_page_size = settings.ORDERS_LIST_MAX_PAGE_SIZE
+    ordering = ('created_at', 'id')
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Метод выборки страницы заказов."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, order_id = position
+            # Условие равносильно (created_at, id) > позиции, но первая
+            # часть дает диапазон по индексу на created_at.
+            queryset = queryset.filter(created_at__gte=created_at).exclude(
+                created_at=created_at, id__lte=order_id
+            )
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = (page[-1].created_at, page[-1].pk)
+        return page
+
+    def get_page_size(self, request):
+        """Метод получения размера страницы из параметров запроса."""
+        try:
+            page_size = int(
+                request.query_params[self.page_size_query_param]
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Метод разбора курсора в позицию (created_at, id)."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            created_at, order_id = b64decode(
+                encoded.encode(), altchars=b'-_', validate=True
+            ).decode().rsplit('|', 1)
+            position = (parse_datetime(created_at), int(order_id))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        """Метод кодирования позиции в курсор."""
+        created_at, order_id = position
+        return b64encode(
+            f'{created_at.isoformat()}|{order_id}'.encode(), altchars=b'-_'
+        ).decode()
+
+    def get_next_link(self):
+        """Метод получения ссылки на следующую страницу."""
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        """Метод формирования ответа со страницей заказов."""
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        """Метод описания ответа со страницей для схемы OpenAPI."""
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True,
+                         'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        """Метод описания параметров пагинации для схемы OpenAPI."""
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор страницы из ссылки next.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Количество заказов на странице.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки с оценкой количества строк большой таблицы.
+
+    Для запроса без условий на PostgreSQL количество берется
+    из pg_class.reltuples (статистика ANALYZE) вместо COUNT(*) по всей
+    таблице, если оценка не меньше
+    ORDERS_ADMIN_ESTIMATED_COUNT_THRESHOLD. Отфильтрованные запросы
+    и небольшие таблицы считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        """Метод получения (оценки) количества строк."""
+        estimate = self.get_estimated_count()
+        if estimate is not None:
+            return estimate
+        return super().count
+
+    def get_estimated_count(self):
+        """Метод получения оценки количества строк из статистики
+        PostgreSQL.
+        """
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                (connection.ops.quote_name(queryset.model._meta.db_table),)
+            )
+            estimate, = cursor.fetchone()
+        if estimate < settings.ORDERS_ADMIN_ESTIMATED_COUNT_THRESHOLD:
+            return None
+        return estimate
@@ -0,0 +1,85 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.json import strict_constant
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data, **kwargs):
+    """Функция разбора JSON через orjson, если он установлен.
+
+    Если orjson не установлен или не разобрал данные, разбор повторяется
+    модулем json с параметрами kwargs: ошибки в ответах API остаются
+    прежними.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data, **kwargs)
+
+
+class FastJSONParser(JSONParser):
+    """Парсер JSON на orjson с заменой JSONParser DRF.
+
+    Разбирает те же данные с тем же результатом, что и JSONParser
+    (числа с дробной частью - float, сообщения об ошибках - от json),
+    но в несколько раз быстрее на больших телах загрузок. Без orjson
+    работает как JSONParser.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Метод разбора тела запроса."""
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                data = data.decode(encoding)
+            return loads(data, parse_constant=(
+                strict_constant if self.strict else None
+            ))
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class NDJSONParser(BaseParser):
+    """Парсер NDJSON (один JSON-объект на строку).
+
+    Тело запроса не читается целиком: request.data - ленивый генератор
+    кортежей (номер строки, данные, ошибка), строки читаются из потока
+    по мере потребления генератора.
+    """
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Метод построчного разбора тела запроса."""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self.iter_lines(stream, encoding)
+
+    @staticmethod
+    def iter_lines(stream, encoding):
+        """Генератор разобранных строк NDJSON."""
+        for line_number, raw_line in enumerate(stream, start=1):
+            try:
+                line = raw_line.decode(encoding).strip()
+            except UnicodeDecodeError as exc:
+                yield line_number, None, f'Ошибка кодировки строки: {exc}.'
+                continue
+            if not line:
+                continue
+            try:
+                yield line_number, loads(line), None
+            except ValueError as exc:
+                yield line_number, None, f'Некорректный JSON: {exc}.'
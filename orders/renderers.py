@@ -0,0 +1,39 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Рендерер JSON на orjson с заменой JSONRenderer DRF.
+
+    Отдает те же байты, что и JSONRenderer с настройками
+    по умолчанию (компактный JSON в UTF-8): даты, Decimal, ленивые
+    строки и прочие значения, которые orjson не сериализует
+    по-своему, передаются в encoder_class DRF. С отступами
+    (Browsable API, indent в Accept), с UNICODE_JSON=False или
+    COMPACT_JSON=False, на значениях, которые orjson не принимает
+    (целые больше 64 бит), и без orjson работает как JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Метод сериализации ответа в JSON."""
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=(orjson.OPT_PASSTHROUGH_DATETIME
+                        | orjson.OPT_NON_STR_KEYS)
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как и JSONRenderer, экранируются U+2028 и U+2029.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029'
+        )
@@ -0,0 +1,99 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Order, OrderStatusRollup, OrderUserRollup, RollupGrain
+
+logger = logging.getLogger('orders')
+
+# Модель интервалов и поле заказа, по которому она группирует.
+ROLLUPS = (
+    (OrderStatusRollup, 'status'),
+    (OrderUserRollup, 'user_id'),
+)
+
+
+def start_of_day(day):
+    """Функция получения начала дня в текущем часовом поясе."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_order_rollups(date_from, date_to):
+    """Функция пересчета временных рядов заказов за период (включительно).
+
+    На каждую модель интервалов - один запрос с группировкой по часу:
+    дневные интервалы складываются из часовых без повторного чтения
+    заказов. Интервалы периода перезаписываются целиком.
+    """
+    period_start = start_of_day(date_from)
+    period_end = start_of_day(date_to + timedelta(days=1))
+    orders = Order.objects.filter(
+        created_at__gte=period_start, created_at__lt=period_end
+    ).annotate(bucket=TruncHour('created_at')).order_by()
+
+    with transaction.atomic():
+        for model, key in ROLLUPS:
+            rollups = []
+            days = defaultdict(lambda: [0, Decimal('0')])
+            for row in orders.values('bucket', key).annotate(
+                orders_count=Count('id'),
+                total_revenue=Sum('total_amount')
+            ):
+                rollups.append(model(grain=RollupGrain.HOUR, **row))
+                day = days[
+                    start_of_day(timezone.localdate(row['bucket'])),
+                    row[key]
+                ]
+                day[0] += row['orders_count']
+                day[1] += row['total_revenue']
+            rollups.extend(
+                model(grain=RollupGrain.DAY, bucket=bucket,
+                      orders_count=orders_count,
+                      total_revenue=total_revenue, **{key: value})
+                for (bucket, value), (orders_count, total_revenue)
+                in days.items()
+            )
+            model.objects.filter(
+                bucket__gte=period_start, bucket__lt=period_end
+            ).delete()
+            model.objects.bulk_create(
+                rollups, batch_size=settings.ORDERS_UPLOAD_BATCH_SIZE
+            )
+    logger.info(
+        'Пересчитаны временные ряды заказов за %s - %s.', date_from, date_to
+    )
+
+
+def get_order_series(date_from, date_to, grain, group_by=None):
+    """Функция получения временного ряда заказов за период (включительно).
+
+    group_by - None (итоги по интервалу), 'status' или 'user'. Ряд
+    читается только из таблиц интервалов.
+    """
+    model = OrderUserRollup if group_by == 'user' else OrderStatusRollup
+    rollups = model.objects.filter(
+        grain=grain,
+        bucket__gte=start_of_day(date_from),
+        bucket__lt=start_of_day(date_to + timedelta(days=1))
+    )
+    if group_by is None:
+        return list(rollups.values('bucket').annotate(
+            orders_count=Sum('orders_count'),
+            total_revenue=Sum('total_revenue')
+        ).order_by('bucket'))
+    key = 'status' if group_by == 'status' else 'user__username'
+    return [
+        {'bucket': bucket, group_by: value, 'orders_count': orders_count,
+         'total_revenue': total_revenue}
+        for bucket, value, orders_count, total_revenue
+        in rollups.order_by('bucket', key).values_list(
+            'bucket', key, 'orders_count', 'total_revenue'
+        )
+    ]
@@ -0,0 +1,81 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.utils import timezone
+
+from .rollups import start_of_day
+
+# Статусы заказов и их доли в синтетических данных.
+STATUSES = ('new', 'paid', 'shipped', 'delivered', 'cancelled')
+STATUS_WEIGHTS = (10, 15, 10, 60, 5)
+
+CENT = Decimal('0.01')
+
+
+class OrderGenerator:
+    """Генератор синтетических заказов для seed_orders и bench_orders.
+
+    Число заказов пользователей и популярность товаров распределены
+    по Парето (небольшая часть пользователей делает большую часть
+    заказов), даты заказов - равномерно за days дней до date_to,
+    число товаров в заказе - от 1 до 2 * items - 1 (в среднем items).
+    При одном и том же seed генерируются одни и те же данные.
+    """
+
+    def __init__(self, seed=0, items=3, days=365, date_to=None,
+                 skus=5000, skew=1.2):
+        self.random = random.Random(seed)
+        self.items = items
+        self.skew = skew
+        date_to = date_to or timezone.localdate() - timedelta(days=1)
+        self.date_from = date_to - timedelta(days=days - 1)
+        self.period_start = start_of_day(self.date_from)
+        self.period_seconds = days * 24 * 60 * 60
+        self.catalog = [
+            (f'SKU-{index:05d}', f'Товар {index}',
+             Decimal(min(self.random.lognormvariate(6, 1), 99999)).quantize(
+                 CENT
+             ))
+            for index in range(skus)
+        ]
+        self.catalog_weights = self.get_weights(skus)
+        self.status_weights = list(accumulate(STATUS_WEIGHTS))
+
+    def get_weights(self, count):
+        """Метод получения накопленных весов Парето для count значений."""
+        return list(accumulate(
+            self.random.paretovariate(self.skew) for _ in range(count)
+        ))
+
+    def choose(self, values, cum_weights, count):
+        """Метод выбора count значений с заданными накопленными весами."""
+        return self.random.choices(values, cum_weights=cum_weights, k=count)
+
+    def order(self, order_number, created_at=None):
+        """Метод генерации заказа в формате валидированных данных загрузки.
+
+        Сумма заказа равна сумме товаров, даты - в текущем часовом поясе.
+        """
+        items = [
+            {'sku': sku, 'name': name,
+             'quantity': self.random.choice((1, 1, 1, 2, 2, 3, 5)),
+             'price': price}
+            for sku, name, price in self.choose(
+                self.catalog, self.catalog_weights,
+                self.random.randint(1, 2 * self.items - 1)
+            )
+        ]
+        return {
+            'order_number': order_number,
+            'created_at': created_at or self.period_start + timedelta(
+                seconds=self.random.randrange(self.period_seconds)
+            ),
+            'total_amount': sum(
+                (item['price'] * item['quantity'] for item in items),
+                Decimal('0')
+            ),
+            'status': self.choose(STATUSES, self.status_weights, 1)[0],
+            'items': items,
+        }
@@ -1,11 +1,15 @@
 import logging
 
-from django.db import transaction
+from django.conf import settings
 from rest_framework import serializers
 
-from core.constants import OrderConstants
+from core.constants import OrderConstants, UploadConstants
 
-from .models import DailyOrderStats, Order, OrderItem, User
+from .log import Truncated
+from .models import (DailyOrderStats, Order, OrderItem, RollupGrain,
+                     UploadJob, User)
+from .services import OrderUploadService
+from .validators import OrderPayloadValidator
 
 
 logger = logging.getLogger('orders')
@@ -25,6 +29,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = ('sku', 'name', 'quantity', 'price')
+        extra_kwargs = {
+            'quantity': {'min_value': 0}
+        }
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -41,26 +48,59 @@ class OrderSerializer(serializers.ModelSerializer):
         }
 
 
-class OrderUploadSerializer(serializers.Serializer):
-    """Сериализатор для модели OrderUpload."""
+class OrderDetailSerializer(OrderSerializer):
+    """Сериализатор для просмотра заказа с пользователем и товарами."""
+
+    user = serializers.SlugRelatedField(
+        slug_field='username', read_only=True
+    )
+
+    class Meta(OrderSerializer.Meta):
+        fields = ('id', 'user', 'order_number', 'created_at',
+                  'total_amount', 'status', 'items')
+        read_only_fields = fields
+
+
+class UploadUserSerializer(serializers.Serializer):
+    """Сериализатор пользователя, для которого загружаются заказы."""
 
     user = serializers.CharField(max_length=OrderConstants.MAX_USERNAME_LENGTH)
-    orders = OrderSerializer(many=True)
 
     def validate_user(self, value):
         """Метод валидации пользователя."""
-        logger.debug(f'Валидация пользователя: {value}.')
+        logger.debug('Валидация пользователя: %s.', value)
         if not value.strip():
             logger.warning('Получено пустое имя пользователя.')
             raise serializers.ValidationError(
                 'Имя пользователя не может быть пустым.'
             )
-        logger.info(f'Пользователь прошел валидацию: {value}.')
+        logger.info('Пользователь прошел валидацию: %s.', value)
         return value.strip()
 
+
+fast_upload_validator = OrderPayloadValidator(
+    OrderSerializer, UploadUserSerializer
+)
+
+
+class OrderUploadSerializer(UploadUserSerializer):
+    """Сериализатор для модели OrderUpload."""
+
+    orders = OrderSerializer(many=True)
+
+    def to_internal_value(self, data):
+        """Метод валидации данных загрузки.
+
+        При ORDERS_UPLOAD_VALIDATOR = 'fast' данные проверяются
+        OrderPayloadValidator без построения вложенных сериализаторов.
+        """
+        if settings.ORDERS_UPLOAD_VALIDATOR == UploadConstants.VALIDATOR_FAST:
+            return fast_upload_validator.validate_upload(data, self)
+        return super().to_internal_value(data)
+
     def validate_orders(self, value):
         """Метод валидации списка заказов."""
-        logger.debug(f'Валидация {len(value)} заказа(ов).')
+        logger.debug('Валидация %s заказа(ов).', len(value))
 
         if not value:
             logger.error('Получен пустой список заказов.')
@@ -71,130 +111,94 @@ class OrderUploadSerializer(serializers.Serializer):
         order_numbers = [order['order_number'] for order in value]
         if len(order_numbers) != len(set(order_numbers)):
             logger.warning(
-                f'Обнаружены дубликаты order_number: {order_numbers}.'
+                'Обнаружены дубликаты order_number: %s.',
+                Truncated(order_numbers)
             )
             raise serializers.ValidationError(
                 'Номер(а) заказа(ов) должны быть уникальными.'
             )
 
         logger.info(
-            f'Успешная валидация {len(value)} заказа(ов) '
-            f'с номером(ами): {order_numbers}.'
+            'Успешная валидация %s заказа(ов) с номером(ами): %s.',
+            len(value), Truncated(order_numbers)
         )
         return value
 
     def create(self, validated_data):
         """Метод создания или обновления данных заказа."""
-        user_data = validated_data['user']
-        orders_data = validated_data['orders']
-
-        logger.info(
-            f'Начало обработки заказа(ов) для пользователя: {user_data}.'
+        service = OrderUploadService(
+            validated_data['user'],
+            strategy=self.context.get('strategy'),
+            progress_callback=validated_data.get('progress_callback')
         )
-        logger.debug(f'Количество заказов: {len(orders_data)}.')
-
-        with transaction.atomic():
-            user, created = User.objects.get_or_create(username=user_data)
-            if created:
-                logger.info(f'Создан новый пользователь: {user.username}.')
-            else:
-                logger.debug(
-                    f'Найден существующий пользователь: {user.username}.'
-                )
-
-            orders_to_create = []
-            orders_to_update = []
-            order_items_to_create = []
-
-            order_numbers = [
-                order_data['order_number'] for order_data in orders_data
-            ]
-            existing_orders = Order.objects.filter(
-                order_number__in=order_numbers
-            )
-            existing_orders_dict = {
-                order.order_number: order for order in existing_orders
-            }
-
-            logger.debug(
-                f'Найдено существующих заказов: {len(existing_orders_dict)}.'
+        return service.upload(validated_data['orders'])
+
+
+class OrderStreamValidator:
+    """Построчный валидатор заказов потоковой загрузки.
+
+    Принимает строки от NDJSONParser и отдает только валидные заказы.
+    Ошибки строк накапливаются (не более max_errors подробностей)
+    и не прерывают загрузку.
+    """
+
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.errors = []
+        self.invalid_lines = 0
+        self.order_numbers = set()
+
+    def __call__(self, lines):
+        """Генератор валидированных заказов."""
+        for line_number, data, error in lines:
+            if error is not None:
+                self.add_error(line_number, {'non_field_errors': [error]})
+                continue
+
+            order_data, errors = self.validate_order(data)
+            if errors:
+                self.add_error(line_number, errors)
+                continue
+
+            order_number = order_data['order_number']
+            if order_number in self.order_numbers:
+                self.add_error(line_number, {'order_number': [
+                    f'Заказ {order_number} уже встречался в загрузке.'
+                ]})
+                continue
+
+            self.order_numbers.add(order_number)
+            yield order_data
+
+    @staticmethod
+    def validate_order(data):
+        """Метод проверки одного заказа."""
+        if settings.ORDERS_UPLOAD_VALIDATOR == UploadConstants.VALIDATOR_FAST:
+            return fast_upload_validator.validate_order(data)
+        serializer = OrderSerializer(data=data)
+        if serializer.is_valid():
+            return serializer.validated_data, None
+        return None, serializer.errors
+
+    def add_error(self, line_number, errors):
+        """Метод учета ошибки валидации строки.
+
+        Подробности пишутся в журнал только для первых max_errors
+        ошибок, остальные строки только учитываются.
+        """
+        self.invalid_lines += 1
+        if len(self.errors) < self.max_errors:
+            logger.warning(
+                'Строка %s не прошла валидацию: %s.',
+                line_number, Truncated(errors)
             )
-
-            for order_data in orders_data:
-                items_data = order_data.pop('items')
-                order_number = order_data['order_number']
-
-                if order_number in existing_orders_dict:
-                    order = existing_orders_dict[order_number]
-                    for attr, value in order_data.items():
-                        setattr(order, attr, value)
-                    order.user = user
-                    orders_to_update.append(order)
-                    logger.debug(
-                        f'Заказ {order_number} подготовлен к обновлению.'
-                    )
-                else:
-                    order = Order(user=user, **order_data)
-                    orders_to_create.append(order)
-                    logger.debug(
-                        f'Заказ {order_number} подготовлен к созданию.'
-                    )
-
-                deleted_count, _ = OrderItem.objects.filter(
-                    order=order
-                ).delete()
-                if deleted_count > 0:
-                    logger.debug(
-                        f'Удалено {deleted_count} старых товаров '
-                        f'из заказа {order_number}.'
-                    )
-
-                order_items = [
-                    OrderItem(order=order,
-                              **item_data
-                              ) for item_data in items_data
-                ]
-                order_items_to_create.extend(order_items)
-                logger.debug(
-                    f'Подготовлено {len(order_items)} товаров '
-                    f'для заказа {order_number}.')
-
-            if orders_to_create:
-                Order.objects.bulk_create(orders_to_create)
-                logger.info(
-                    f'Создано {len(orders_to_create)} новых заказов.'
-                )
-
-            if orders_to_update:
-                Order.objects.bulk_update(
-                    orders_to_update,
-                    ['user', 'created_at', 'total_amount', 'status'])
-                logger.info(
-                    f'Обновлено {len(orders_to_update)} существующих заказов.'
-                )
-
-            if order_items_to_create:
-                OrderItem.objects.bulk_create(order_items_to_create)
-                logger.info(
-                    f'Создано {len(order_items_to_create)} товаров.'
+            self.errors.append({'line': line_number, 'errors': errors})
+            if len(self.errors) == self.max_errors:
+                logger.warning(
+                    'Достигнут предел ошибок валидации (%s), дальнейшие '
+                    'ошибки не записываются в журнал.', self.max_errors
                 )
 
-            result = {
-                'user': user,
-                'created_orders': len(orders_to_create),
-                'updated_orders': len(orders_to_update),
-                'created_items': len(order_items_to_create)
-            }
-
-            logger.info(
-                f'Успешно обработаны заказы для {user.username}. '
-                f'Создано: {len(orders_to_create)} заказов, '
-                f'Обновлено: {len(orders_to_update)} заказов, '
-                f'Создано: {len(order_items_to_create)} товаров.'
-            )
-
-            return result
-
 
 class UserStatsSerializer(serializers.Serializer):
     """Сериализатор для модели UserStats."""
@@ -229,10 +233,128 @@ class UserStatsSerializer(serializers.Serializer):
         return value
 
 
+class UserStatsBulkSerializer(serializers.Serializer):
+    """Сериализатор запроса статистики нескольких пользователей."""
+
+    users = serializers.ListField(
+        child=serializers.CharField(
+            max_length=OrderConstants.MAX_USERNAME_LENGTH
+        ),
+        allow_empty=False,
+        max_length=settings.ORDERS_STATS_BULK_MAX_USERS
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate_users(self, value):
+        """Метод валидации списка пользователей.
+
+        Пустые имена отбрасываются, повторы убираются с сохранением
+        порядка.
+        """
+        users = list(dict.fromkeys(
+            username.strip() for username in value if username.strip()
+        ))
+        if not users:
+            raise serializers.ValidationError(
+                'Список пользователей не может быть пустым.'
+            )
+        return users
+
+    def validate(self, data):
+        """Метод валидации периода статистики."""
+        date_from = data.get('date_from')
+        date_to = data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError(
+                {'date_to': 'Дата окончания не может быть раньше '
+                            'даты начала.'}
+            )
+        return data
+
+
+class UserStatsBulkResponseSerializer(serializers.Serializer):
+    """Сериализатор ответа статистики нескольких пользователей."""
+
+    stats = UserStatsSerializer(many=True)
+    unknown_users = serializers.ListField(child=serializers.CharField())
+
+
 class DailyStatsSerializer(serializers.ModelSerializer):
     """Сериализатор для ежедневной статистики."""
 
     class Meta:
         model = DailyOrderStats
         fields = ('date', 'total_users', 'total_orders',
-                  'total_revenue', 'avg_order_value', 'created_at')
+                  'total_revenue', 'avg_order_value', 'created_at',
+                  'updated_at')
+
+
+class DailyStatsQuerySerializer(serializers.Serializer):
+    """Сериализатор параметров фильтрации ежедневной статистики."""
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        """Метод валидации периода статистики."""
+        date_from = data.get('date_from')
+        date_to = data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError(
+                {'date_to': 'Дата окончания не может быть раньше '
+                            'даты начала.'}
+            )
+        return data
+
+
+class OrderSeriesQuerySerializer(serializers.Serializer):
+    """Сериализатор параметров временного ряда заказов."""
+
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    grain = serializers.ChoiceField(
+        choices=RollupGrain.choices, default=RollupGrain.DAY
+    )
+    group_by = serializers.ChoiceField(
+        choices=('status', 'user'), required=False
+    )
+
+    def validate(self, data):
+        """Метод валидации периода временного ряда."""
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError(
+                {'date_to': 'Дата окончания не может быть раньше '
+                            'даты начала.'}
+            )
+        days = (data['date_to'] - data['date_from']).days + 1
+        if days > settings.ORDERS_STATS_SERIES_MAX_DAYS:
+            raise serializers.ValidationError(
+                {'date_to': f'Период не может быть длиннее '
+                            f'{settings.ORDERS_STATS_SERIES_MAX_DAYS} дней.'}
+            )
+        return data
+
+
+class OrderSeriesPointSerializer(serializers.Serializer):
+    """Сериализатор интервала временного ряда заказов."""
+
+    bucket = serializers.DateTimeField()
+    status = serializers.CharField(required=False)
+    user = serializers.CharField(required=False)
+    orders_count = serializers.IntegerField()
+    total_revenue = serializers.DecimalField(
+        max_digits=OrderConstants.MAX_TOTAL_AMOUNT,
+        decimal_places=OrderConstants.MAX_DECIMAL_PLACES
+    )
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    """Сериализатор для задачи асинхронной загрузки заказов."""
+
+    class Meta:
+        model = UploadJob
+        fields = ('id', 'status', 'total_orders', 'processed_orders',
+                  'statistics', 'errors', 'created_at', 'started_at',
+                  'finished_at')
+        read_only_fields = fields
@@ -0,0 +1,388 @@
+import hashlib
+import json
+import logging
+from contextlib import nullcontext
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.constants import UploadConstants
+
+from .cache import invalidate_user_stats
+from .models import Order, OrderItem, User
+from .stats import (OrderState, apply_daily_stats_changes,
+                    apply_user_stats_changes, mark_daily_stats_dirty)
+
+logger = logging.getLogger('orders')
+
+ORDER_FIELDS = ('order_number', 'created_at', 'total_amount', 'status')
+ORDER_UPDATE_FIELDS = ('user', 'created_at', 'total_amount', 'status',
+                       'content_hash')
+
+
+def iter_chunks(iterable, size):
+    """Функция разбиения итерируемого объекта на пачки заданного размера."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_order_hash(username, order_data):
+    """Функция расчета хеша содержимого заказа.
+
+    Хеш считается по пользователю, полям заказа и набору товаров
+    (без учета их порядка) валидированного заказа. Совпадение с хешем
+    сохраненного заказа означает, что повторная запись ничего
+    не изменит.
+    """
+    content = (
+        username,
+        order_data['created_at'].astimezone(dt_timezone.utc).isoformat(),
+        str(order_data['total_amount']),
+        order_data['status'],
+        sorted(
+            (item['sku'], item['name'], item['quantity'], str(item['price']))
+            for item in order_data['items']
+        ),
+    )
+    return hashlib.md5(
+        json.dumps(content, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+class OrderUploadService:
+    """Сервис записи загружаемых заказов пользователя пачками.
+
+    Заказы читаются из любого итерируемого объекта и записываются
+    пачками по batch_size, поэтому объем памяти на запись ограничен
+    размером пачки, а не всей загрузки.
+    """
+
+    def __init__(self, username, strategy=None, batch_size=None,
+                 transaction_mode=None, progress_callback=None):
+        self.username = username
+        self.progress_callback = progress_callback
+        self.strategy = self.get_strategy(
+            strategy or settings.ORDERS_UPLOAD_STRATEGY
+        )
+        self.batch_size = batch_size or settings.ORDERS_UPLOAD_BATCH_SIZE
+        self.transaction_mode = (
+            transaction_mode or settings.ORDERS_UPLOAD_TRANSACTION
+        )
+        self.user = None
+        # Пользователи, у которых загрузка забрала заказы (id и имена).
+        self.previous_user_ids = set()
+        self.previous_usernames = set()
+        # Дни (по created_at до и после записи), затронутые загрузкой.
+        self.touched_dates = set()
+        self.statistics = {
+            'created_orders': 0,
+            'updated_orders': 0,
+            'unchanged_orders': 0,
+            'created_items': 0,
+        }
+
+    @staticmethod
+    def get_strategy(strategy):
+        """Метод выбора стратегии записи заказов."""
+        if strategy not in UploadConstants.STRATEGIES:
+            logger.warning(
+                'Неизвестная стратегия записи заказов: %s.', strategy
+            )
+            return UploadConstants.STRATEGY_DIFF
+        if (strategy == UploadConstants.STRATEGY_UPSERT
+                and not connection.features
+                .supports_update_conflicts_with_target):
+            logger.warning(
+                'СУБД %s не поддерживает upsert по order_number, используется '
+                'стратегия diff.', connection.vendor
+            )
+            return UploadConstants.STRATEGY_DIFF
+        return strategy
+
+    def upload_atomic(self):
+        """Метод получения транзакции на всю загрузку."""
+        if self.transaction_mode == UploadConstants.TRANSACTION_CHUNK:
+            return nullcontext()
+        return transaction.atomic()
+
+    def chunk_atomic(self):
+        """Метод получения транзакции на одну пачку заказов."""
+        if self.transaction_mode == UploadConstants.TRANSACTION_CHUNK:
+            return transaction.atomic()
+        return nullcontext()
+
+    def upload(self, orders_data):
+        """Метод создания или обновления заказов пользователя."""
+        logger.info(
+            'Начало обработки заказа(ов) для пользователя: %s. Стратегия: %s, '
+            'размер пачки: %s, транзакция: %s.',
+            self.username, self.strategy, self.batch_size,
+            self.transaction_mode
+        )
+
+        try:
+            with self.upload_atomic():
+                for chunk in iter_chunks(orders_data, self.batch_size):
+                    with self.chunk_atomic():
+                        if self.user is None:
+                            self.user = self.get_user()
+                        self.write_chunk(chunk)
+                    if self.progress_callback is not None:
+                        self.progress_callback(
+                            self.statistics['created_orders']
+                            + self.statistics['updated_orders']
+                            + self.statistics['unchanged_orders']
+                        )
+        finally:
+            # В режиме 'chunk' часть пачек могла зафиксироваться
+            # даже при ошибке, поэтому кэш сбрасывается в любом случае.
+            self.invalidate_stats()
+            self.mark_touched_dates()
+
+        logger.info(
+            'Успешно обработаны заказы для %s. Создано: %s заказов, '
+            'Обновлено: %s заказов, Без изменений: %s заказов, '
+            'Создано: %s товаров.',
+            self.username, self.statistics['created_orders'],
+            self.statistics['updated_orders'],
+            self.statistics['unchanged_orders'],
+            self.statistics['created_items']
+        )
+        return {'user': self.user, **self.statistics}
+
+    def invalidate_stats(self):
+        """Метод сброса кэша статистики затронутых пользователей.
+
+        Вызывается и после ошибки, когда транзакция может быть уже
+        непригодна для запросов, поэтому имена пользователей собираются
+        заранее, при записи пачек.
+        """
+        if self.user is None:
+            return
+        usernames = {self.username, *self.previous_usernames}
+        transaction.on_commit(lambda: invalidate_user_stats(usernames))
+
+    def mark_touched_dates(self):
+        """Метод отметки затронутых дней для пересчета статистики.
+
+        Отметка делается после фиксации транзакции, чтобы не держать
+        блокировки строк общих дней на время загрузки.
+        """
+        if not self.touched_dates:
+            return
+        dates = set(self.touched_dates)
+        transaction.on_commit(lambda: mark_daily_stats_dirty(dates))
+
+    def get_user(self):
+        """Метод получения или создания пользователя."""
+        user, created = User.objects.get_or_create(username=self.username)
+        if created:
+            logger.info('Создан новый пользователь: %s.', user.username)
+        else:
+            logger.debug(
+                'Найден существующий пользователь: %s.', user.username
+            )
+        return user
+
+    def write_chunk(self, orders_data):
+        """Метод записи одной пачки заказов."""
+        orders_to_create = []
+        orders_to_update = []
+        order_items_to_create = []
+        changes = []
+
+        order_numbers = [
+            order_data['order_number'] for order_data in orders_data
+        ]
+        # Состояние существующих заказов до записи - для пересчета
+        # агрегированной статистики по разнице, и хеши их содержимого -
+        # для пропуска неизмененных заказов.
+        previous_states = {}
+        existing_hashes = {}
+        if self.strategy == UploadConstants.STRATEGY_UPSERT:
+            existing_orders_dict = {}
+            for (order_number, order_id, user_id, created_at,
+                 total_amount, content_hash) in Order.objects.filter(
+                order_number__in=order_numbers
+            ).values_list('order_number', 'id', 'user_id', 'created_at',
+                          'total_amount', 'content_hash'):
+                existing_orders_dict[order_number] = order_id
+                existing_hashes[order_number] = content_hash
+                previous_states[order_number] = OrderState(
+                    user_id, created_at, total_amount
+                )
+        else:
+            existing_orders_dict = {
+                order.order_number: order
+                for order in Order.objects.filter(
+                    order_number__in=order_numbers
+                )
+            }
+            for order_number, order in existing_orders_dict.items():
+                existing_hashes[order_number] = order.content_hash
+                previous_states[order_number] = OrderState(
+                    order.user_id, order.created_at, order.total_amount
+                )
+        previous_user_ids = {
+            state.user_id for state in previous_states.values()
+            if state.user_id != self.user.pk
+        } - self.previous_user_ids
+        if previous_user_ids:
+            self.previous_user_ids.update(previous_user_ids)
+            self.previous_usernames.update(User.objects.filter(
+                id__in=previous_user_ids
+            ).values_list('username', flat=True))
+
+        logger.debug(
+            'Найдено существующих заказов: %s из %s.',
+            len(existing_orders_dict), len(order_numbers)
+        )
+
+        unchanged_count = 0
+        for order_data in orders_data:
+            order_number = order_data['order_number']
+            content_hash = get_order_hash(self.username, order_data)
+            if existing_hashes.get(order_number) == content_hash:
+                unchanged_count += 1
+                continue
+            order_fields = {field: order_data[field] for field in ORDER_FIELDS}
+            order_fields['content_hash'] = content_hash
+
+            if self.strategy == UploadConstants.STRATEGY_UPSERT:
+                order = Order(user=self.user, **order_fields)
+                if order_number in existing_orders_dict:
+                    orders_to_update.append(order)
+                else:
+                    orders_to_create.append(order)
+            elif order_number in existing_orders_dict:
+                order = existing_orders_dict[order_number]
+                for attr, value in order_fields.items():
+                    setattr(order, attr, value)
+                order.user = self.user
+                orders_to_update.append(order)
+                logger.debug(
+                    'Заказ %s подготовлен к обновлению.', order_number
+                )
+            else:
+                order = Order(user=self.user, **order_fields)
+                orders_to_create.append(order)
+                logger.debug('Заказ %s подготовлен к созданию.', order_number)
+
+            order_items_to_create.extend(
+                OrderItem(order=order, **item_data)
+                for item_data in order_data['items']
+            )
+            changes.append((
+                previous_states.get(order_number),
+                OrderState(self.user.pk, order_fields['created_at'],
+                           order_fields['total_amount'])
+            ))
+
+        if self.strategy == UploadConstants.STRATEGY_UPSERT:
+            self.upsert_orders(
+                orders_to_create, orders_to_update, existing_orders_dict
+            )
+        else:
+            self.bulk_save_orders(orders_to_create, orders_to_update)
+
+        orders_with_items = orders_to_update
+        if self.strategy == UploadConstants.STRATEGY_UPSERT:
+            # Заказ, созданный параллельной загрузкой между чтением
+            # и upsert, обновляется по конфликту: его старые товары
+            # тоже нужно удалить.
+            orders_with_items = orders_to_update + orders_to_create
+        if orders_with_items:
+            deleted_count, _ = OrderItem.objects.filter(
+                order_id__in=[order.pk for order in orders_with_items]
+            ).delete()
+            logger.debug(
+                'Удалено %s старых товаров из %s заказов.',
+                deleted_count, len(orders_with_items)
+            )
+
+        if order_items_to_create:
+            OrderItem.objects.bulk_create(
+                order_items_to_create, batch_size=self.batch_size
+            )
+            logger.debug('Создано %s товаров.', len(order_items_to_create))
+
+        apply_user_stats_changes(changes)
+        apply_daily_stats_changes(changes)
+        self.touched_dates.update(
+            timezone.localdate(state.created_at)
+            for change in changes for state in change if state is not None
+        )
+
+        self.statistics['created_orders'] += len(orders_to_create)
+        self.statistics['updated_orders'] += len(orders_to_update)
+        self.statistics['unchanged_orders'] += unchanged_count
+        self.statistics['created_items'] += len(order_items_to_create)
+
+    def bulk_save_orders(self, orders_to_create, orders_to_update):
+        """Метод записи заказов через bulk_create и bulk_update."""
+        if orders_to_create:
+            Order.objects.bulk_create(
+                orders_to_create, batch_size=self.batch_size
+            )
+            logger.debug('Создано %s новых заказов.', len(orders_to_create))
+
+        if orders_to_update:
+            Order.objects.bulk_update(
+                orders_to_update, ORDER_UPDATE_FIELDS,
+                batch_size=self.batch_size
+            )
+            logger.debug(
+                'Обновлено %s существующих заказов.', len(orders_to_update)
+            )
+
+    def upsert_orders(self, orders_to_create, orders_to_update,
+                      existing_order_ids):
+        """Метод записи заказов одним INSERT ... ON CONFLICT DO UPDATE.
+
+        Заказ, который параллельная загрузка создала после чтения
+        существующих заказов, обновляется, но учитывается как созданный,
+        а его прежнее состояние не вычитается из статистики
+        пользователя. Такие расхождения исправляют задачи
+        reconcile_user_stats и daily_order_stats, но загрузки
+        с пересекающимися номерами заказов лучше не выполнять
+        параллельно.
+        """
+        orders = orders_to_create + orders_to_update
+        if not orders:
+            return
+
+        Order.objects.bulk_create(
+            orders,
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=('order_number',),
+            update_fields=ORDER_UPDATE_FIELDS
+        )
+
+        # bulk_create с update_conflicts не возвращает первичные ключи,
+        # поэтому id существующих заказов берутся из предварительного
+        # чтения, а id созданных дочитываются одним запросом.
+        for order in orders_to_update:
+            order.pk = existing_order_ids[order.order_number]
+        created_without_pk = {
+            order.order_number: order
+            for order in orders_to_create if order.pk is None
+        }
+        if created_without_pk:
+            created_ids = Order.objects.filter(
+                order_number__in=created_without_pk
+            ).values_list('order_number', 'id')
+            for order_number, order_id in created_ids:
+                created_without_pk[order_number].pk = order_id
+
+        logger.debug(
+            'Upsert %s заказов: создано %s, обновлено %s.',
+            len(orders), len(orders_to_create), len(orders_to_update)
+        )
@@ -0,0 +1,409 @@
+import logging
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import (DailyOrderStats, DailyStatsDirtyDate, DailyUserActivity,
+                     Order, User, UserOrderStats)
+from .rollups import rebuild_order_rollups
+
+logger = logging.getLogger('orders')
+
+DAILY_STATS_FIELDS = ('total_users', 'total_orders', 'total_revenue',
+                      'avg_order_value', 'updated_at')
+
+OrderState = namedtuple(
+    'OrderState', ('user_id', 'created_at', 'total_amount')
+)
+
+
+def apply_user_stats_changes(changes):
+    """Функция применения изменений заказов к статистике пользователей.
+
+    changes - пары (состояние до записи, состояние после записи),
+    для новых заказов состояние до записи - None, для удаленных -
+    состояние после записи. Вызывается в той же транзакции после
+    записи заказов. Строка пользователя без
+    статистики (заказы загружены до появления UserOrderStats)
+    создается по агрегату его заказов без учета этих изменений.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for previous, current in changes:
+        if previous is not None:
+            deltas[previous.user_id][0] -= 1
+            deltas[previous.user_id][1] -= previous.total_amount
+        if current is not None:
+            deltas[current.user_id][0] += 1
+            deltas[current.user_id][1] += current.total_amount
+
+    deltas = {
+        user_id: delta for user_id, delta in deltas.items() if any(delta)
+    }
+    if not deltas:
+        return
+
+    missing = set(deltas).difference(UserOrderStats.objects.filter(
+        user_id__in=deltas
+    ).values_list('user_id', flat=True))
+    if missing:
+        totals = {
+            user_id: (orders_count, total_revenue)
+            for user_id, orders_count, total_revenue in Order.objects.filter(
+                user_id__in=missing
+            ).values('user_id').annotate(
+                orders_count=Count('id'), total_revenue=Sum('total_amount')
+            ).values_list('user_id', 'orders_count', 'total_revenue')
+        }
+        stats = []
+        for user_id in missing:
+            orders_count, total_revenue = totals.get(user_id, (0, 0))
+            stats.append(UserOrderStats(
+                user_id=user_id,
+                orders_count=max(orders_count - deltas[user_id][0], 0),
+                total_revenue=max(
+                    (total_revenue or Decimal('0')) - deltas[user_id][1],
+                    Decimal('0')
+                )
+            ))
+        UserOrderStats.objects.bulk_create(stats, ignore_conflicts=True)
+        logger.info(
+            'Создана статистика %s пользователей по их заказам.',
+            len(stats)
+        )
+
+    # Строки обновляются в порядке user_id, чтобы параллельные
+    # транзакции не блокировали друг друга по кругу.
+    for user_id, (orders_delta, revenue_delta) in sorted(deltas.items()):
+        UserOrderStats.objects.filter(user_id=user_id).update(
+            orders_count=Greatest(F('orders_count') + orders_delta, 0),
+            total_revenue=Greatest(
+                F('total_revenue') + revenue_delta, Decimal('0')
+            )
+        )
+    logger.debug('Обновлена статистика %s пользователей.', len(deltas))
+
+
+def get_users_stats(usernames, created_from=None, created_to=None):
+    """Функция получения статистики заказов нескольких пользователей.
+
+    Вся статистика считается одним запросом: без периода - из
+    UserOrderStats, с периодом - агрегатом заказов с группировкой
+    по пользователю. Возвращает кортеж (статистика в порядке usernames,
+    имена неизвестных пользователей).
+    """
+    if created_from is None and created_to is None:
+        rows = User.objects.filter(username__in=usernames).values_list(
+            'username', 'order_stats__orders_count',
+            'order_stats__total_revenue'
+        )
+    else:
+        period = Q()
+        if created_from is not None:
+            period &= Q(orders__created_at__gte=created_from)
+        if created_to is not None:
+            period &= Q(orders__created_at__lt=created_to)
+        rows = User.objects.filter(username__in=usernames).values(
+            'username'
+        ).annotate(
+            orders_count=Count('orders', filter=period),
+            total_revenue=Sum('orders__total_amount', filter=period)
+        ).values_list('username', 'orders_count', 'total_revenue')
+
+    found = {}
+    for username, orders_count, total_revenue in rows:
+        orders_count = orders_count or 0
+        total_revenue = total_revenue or Decimal('0')
+        found[username] = {
+            'user': username,
+            'orders_count': orders_count,
+            'total_revenue': total_revenue,
+            'avg_order_value': (
+                total_revenue / orders_count if orders_count
+                else Decimal('0')
+            )
+        }
+    return (
+        [found[username] for username in usernames if username in found],
+        [username for username in usernames if username not in found]
+    )
+
+
+def iter_date_ranges(date_from, date_to, days):
+    """Функция разбиения периода на отрезки не длиннее days дней.
+
+    Границы периода и отрезков включительно.
+    """
+    start = date_from
+    while start <= date_to:
+        end = min(start + timedelta(days=days - 1), date_to)
+        yield start, end
+        start = end + timedelta(days=1)
+
+
+def group_date_ranges(dates):
+    """Функция объединения дат в непрерывные отрезки (start, end)."""
+    ranges = []
+    for day in sorted(set(dates)):
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(date_range) for date_range in ranges]
+
+
+def get_period_orders(date_from, date_to):
+    """Функция получения заказов за период с днем created_at (day)."""
+    return Order.objects.filter(
+        created_at__gte=timezone.make_aware(
+            datetime.combine(date_from, time.min)
+        ),
+        created_at__lt=timezone.make_aware(
+            datetime.combine(date_to + timedelta(days=1), time.min)
+        )
+    ).annotate(day=TruncDate('created_at')).order_by()
+
+
+def compute_daily_stats(date_from, date_to):
+    """Функция расчета статистики заказов за период (включительно).
+
+    Все дни считаются одним запросом с группировкой по дню created_at
+    в текущем часовом поясе. Возвращает несохраненные DailyOrderStats
+    за каждый день периода, за дни без заказов - нулевые.
+    """
+    rows = get_period_orders(date_from, date_to).values('day').annotate(
+        total_users=Count('user', distinct=True),
+        total_orders=Count('id'),
+        total_revenue=Sum('total_amount'),
+        avg_order_value=Avg('total_amount')
+    )
+    stats_by_day = {row.pop('day'): row for row in rows}
+    return [
+        DailyOrderStats(date=day, **stats_by_day.get(day, {}))
+        for day in (
+            date_from + timedelta(days=offset)
+            for offset in range((date_to - date_from).days + 1)
+        )
+    ]
+
+
+def rebuild_daily_stats(date_from, date_to):
+    """Функция пересчета DailyOrderStats за период (включительно).
+
+    Статистика считается одним запросом и записывается одним upsert,
+    в том числе нулевые строки за дни без заказов. Вместе с ней
+    перестраиваются DailyUserActivity и временные ряды заказов
+    за период. Возвращает количество записанных дней.
+    """
+    daily_stats = compute_daily_stats(date_from, date_to)
+    activity = [
+        DailyUserActivity(**row)
+        for row in get_period_orders(date_from, date_to).values(
+            'user_id', date=F('day')
+        ).annotate(orders_count=Count('id'))
+    ]
+    with transaction.atomic():
+        DailyUserActivity.objects.filter(
+            date__range=(date_from, date_to)
+        ).delete()
+        DailyUserActivity.objects.bulk_create(
+            activity, batch_size=settings.ORDERS_UPLOAD_BATCH_SIZE
+        )
+        DailyOrderStats.objects.bulk_create(
+            daily_stats,
+            batch_size=settings.ORDERS_UPLOAD_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=('date',),
+            update_fields=DAILY_STATS_FIELDS
+        )
+        rebuild_order_rollups(date_from, date_to)
+    logger.info(
+        'Пересчитана ежедневная статистика за %s - %s: %s дн.',
+        date_from, date_to, len(daily_stats)
+    )
+    return len(daily_stats)
+
+
+def verify_daily_stats(date_from, date_to):
+    """Функция сверки DailyOrderStats с заказами за период.
+
+    Дни, где количество пользователей, заказов или выручка расходятся
+    с заказами (или строки нет), пересчитываются. Возвращает список
+    дней с расхождениями.
+    """
+    stored = {
+        daily_stats.date: daily_stats
+        for daily_stats in DailyOrderStats.objects.filter(
+            date__range=(date_from, date_to)
+        )
+    }
+    drift = []
+    for expected in compute_daily_stats(date_from, date_to):
+        actual = stored.get(expected.date)
+        if actual is None or any(
+            getattr(actual, field) != getattr(expected, field)
+            for field in ('total_users', 'total_orders', 'total_revenue')
+        ):
+            drift.append(expected.date)
+    for day in drift:
+        logger.warning(
+            'Ежедневная статистика за %s расходится с заказами и будет '
+            'пересчитана.', day
+        )
+    for range_from, range_to in group_date_ranges(drift):
+        rebuild_daily_stats(range_from, range_to)
+    return drift
+
+
+def apply_daily_stats_changes(changes):
+    """Функция применения изменений заказов к ежедневной статистике.
+
+    changes - пары (состояние до записи, состояние после записи), как
+    в apply_user_stats_changes. Учитывает перенос заказа между днями
+    и изменение суммы. Вызывается в той же транзакции, что и запись
+    заказов.
+    """
+    orders_deltas = defaultdict(int)
+    revenue_deltas = defaultdict(Decimal)
+    for previous, current in changes:
+        if previous is not None:
+            day = timezone.localdate(previous.created_at)
+            orders_deltas[day, previous.user_id] -= 1
+            revenue_deltas[day] -= previous.total_amount
+        if current is not None:
+            day = timezone.localdate(current.created_at)
+            orders_deltas[day, current.user_id] += 1
+            revenue_deltas[day] += current.total_amount
+
+    orders_deltas = {key: delta for key, delta in orders_deltas.items()
+                     if delta}
+    dates = {day for day, _ in orders_deltas} | {
+        day for day, delta in revenue_deltas.items() if delta
+    }
+    if not dates:
+        return
+
+    users_deltas = apply_daily_activity_changes(orders_deltas)
+    day_orders_deltas = defaultdict(int)
+    for (day, _), delta in orders_deltas.items():
+        day_orders_deltas[day] += delta
+
+    DailyOrderStats.objects.bulk_create(
+        [DailyOrderStats(date=day) for day in sorted(dates)],
+        ignore_conflicts=True
+    )
+    # Строки дней блокируются одним запросом в порядке дат, чтобы
+    # параллельные загрузки не блокировали друг друга по кругу.
+    daily_stats = list(DailyOrderStats.objects.select_for_update().filter(
+        date__in=dates
+    ).order_by('date'))
+    updated_at = timezone.now()
+    for stats in daily_stats:
+        stats.total_users = max(
+            stats.total_users + users_deltas.get(stats.date, 0), 0
+        )
+        stats.total_orders = max(
+            stats.total_orders + day_orders_deltas.get(stats.date, 0), 0
+        )
+        stats.total_revenue = max(
+            stats.total_revenue + revenue_deltas[stats.date], Decimal('0')
+        ) if stats.total_orders else Decimal('0')
+        stats.avg_order_value = (
+            stats.total_revenue / stats.total_orders if stats.total_orders
+            else Decimal('0')
+        )
+        stats.updated_at = updated_at
+    DailyOrderStats.objects.bulk_update(
+        daily_stats, DAILY_STATS_FIELDS,
+        batch_size=settings.ORDERS_UPLOAD_BATCH_SIZE
+    )
+    logger.debug('Обновлена ежедневная статистика за %s дн.', len(dates))
+
+
+def apply_daily_activity_changes(orders_deltas):
+    """Функция применения изменений к DailyUserActivity.
+
+    orders_deltas - изменение количества заказов по (день, user_id).
+    Возвращает изменение количества активных пользователей по дням.
+    """
+    if not orders_deltas:
+        return {}
+    # Строки создаются и блокируются в порядке (день, user_id), чтобы
+    # загрузки с пересекающимися днями не блокировали друг друга
+    # по кругу.
+    DailyUserActivity.objects.bulk_create(
+        [DailyUserActivity(date=day, user_id=user_id)
+         for day, user_id in sorted(orders_deltas)],
+        ignore_conflicts=True
+    )
+    user_ids_by_day = defaultdict(list)
+    for day, user_id in orders_deltas:
+        user_ids_by_day[day].append(user_id)
+    condition = Q()
+    for day, user_ids in user_ids_by_day.items():
+        condition |= Q(date=day, user_id__in=user_ids)
+
+    users_deltas = defaultdict(int)
+    activities = list(
+        DailyUserActivity.objects.select_for_update().filter(
+            condition
+        ).order_by('date', 'user_id')
+    )
+    for activity in activities:
+        was_active = activity.orders_count > 0
+        activity.orders_count = max(
+            activity.orders_count
+            + orders_deltas[activity.date, activity.user_id], 0
+        )
+        users_deltas[activity.date] += (
+            (activity.orders_count > 0) - was_active
+        )
+    DailyUserActivity.objects.bulk_update(
+        activities, ('orders_count',),
+        batch_size=settings.ORDERS_UPLOAD_BATCH_SIZE
+    )
+    DailyUserActivity.objects.filter(condition, orders_count=0).delete()
+    return users_deltas
+
+
+def mark_daily_stats_dirty(dates):
+    """Функция отметки дней, статистику которых нужно пересчитать."""
+    marked_at = timezone.now()
+    DailyStatsDirtyDate.objects.bulk_create(
+        [DailyStatsDirtyDate(date=day, marked_at=marked_at)
+         for day in set(dates)],
+        update_conflicts=True,
+        unique_fields=('date',),
+        update_fields=('marked_at',)
+    )
+
+
+def rebuild_dirty_daily_stats():
+    """Функция пересчета статистики отмеченных дней.
+
+    Снимаются только отметки, сделанные до начала пересчета: дни,
+    повторно затронутые загрузкой во время пересчета, останутся
+    отмеченными до следующего запуска. Непрерывные отрезки дней
+    пересчитываются частями не длиннее ORDERS_DAILY_STATS_CHUNK_DAYS,
+    каждая в своей транзакции. Возвращает количество дней.
+    """
+    started_at = timezone.now()
+    dates = list(DailyStatsDirtyDate.objects.filter(
+        marked_at__lte=started_at
+    ).values_list('date', flat=True))
+    for range_from, range_to in group_date_ranges(dates):
+        for date_from, date_to in iter_date_ranges(
+            range_from, range_to, settings.ORDERS_DAILY_STATS_CHUNK_DAYS
+        ):
+            with transaction.atomic():
+                rebuild_daily_stats(date_from, date_to)
+                DailyStatsDirtyDate.objects.filter(
+                    date__range=(date_from, date_to),
+                    marked_at__lte=started_at
+                ).delete()
+    return len(dates)
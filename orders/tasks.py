@@ -1,67 +1,202 @@
+import io
 import logging
 
-from datetime import timedelta
+from datetime import date, timedelta
 
-from celery import shared_task
-from django.db.models import Count, Sum, Avg
+from celery import group, shared_task
+from django.conf import settings
+from django.core.management import call_command
 from django.utils import timezone
 
-from .models import User, Order, DailyOrderStats
+from .log import Truncated
+from .models import DailyOrderStats, UploadJob
+from .serializers import OrderUploadSerializer
+from .stats import (iter_date_ranges, rebuild_daily_stats,
+                    rebuild_dirty_daily_stats, verify_daily_stats)
 
 logger = logging.getLogger('orders')
 
 
 @shared_task
 def daily_order_stats():
-    """Метод создания ежедневной задачи для сбора статистики по заказам."""
+    """Метод создания ежедневной задачи для сверки статистики по заказам.
+
+    Статистика обновляется при загрузке заказов, задача сверяет
+    статистику за вчера с заказами и пересчитывает ее при расхождении.
+    """
 
     stats_date = timezone.now().date() - timedelta(days=1)
 
-    logger.info(f'Начало расчета ежедневной статистики за {stats_date}.')
+    logger.info('Начало сверки ежедневной статистики за %s.', stats_date)
 
     try:
-        if DailyOrderStats.objects.filter(date=stats_date).exists():
-            logger.warning(f'Статистика за {stats_date} уже существует.')
-            return f'Статистика за {stats_date} уже существует.'
+        drift = verify_daily_stats(stats_date, stats_date)
+        daily_stats = DailyOrderStats.objects.get(date=stats_date)
 
-        yesterday_start = timezone.make_aware(
-            timezone.datetime.combine(stats_date, timezone.datetime.min.time())
-        )
-        yesterday_end = timezone.make_aware(
-            timezone.datetime.combine(stats_date, timezone.datetime.max.time())
+        logger.info(
+            'Ежедневная статистика за %s: %s заказов, %s пользователей, '
+            'общая выручка: %.2f, пересчитана: %s.',
+            stats_date, daily_stats.total_orders, daily_stats.total_users,
+            daily_stats.total_revenue, 'да' if drift else 'нет'
         )
 
-        orders_stats = Order.objects.filter(
-            created_at__range=(yesterday_start, yesterday_end)
-        ).aggregate(
-            total_orders=Count('id'),
-            total_revenue=Sum('total_amount'),
-            avg_order_value=Avg('total_amount')
+        if drift:
+            return f'Статистика за {stats_date} пересчитана.'
+        return f'Статистика за {stats_date} совпадает с заказами.'
+
+    except Exception as e:
+        logger.error('Ошибка при сверке статистики за %s: %s.', stats_date, e)
+        raise
+
+
+@shared_task
+def rebuild_daily_stats_range(date_from, date_to):
+    """Метод пересчета ежедневной статистики за период.
+
+    Даты передаются в формате YYYY-MM-DD, границы включительно.
+    """
+    date_from = date.fromisoformat(date_from)
+    date_to = date.fromisoformat(date_to)
+    days = rebuild_daily_stats(date_from, date_to)
+    return f'Статистика за {date_from} - {date_to} пересчитана ({days} дн.).'
+
+
+@shared_task
+def backfill_daily_stats(date_from, date_to, chunk_days=7):
+    """Метод пересчета ежедневной статистики за период на воркерах.
+
+    Период разбивается на отрезки по chunk_days дней, каждый отрезок
+    пересчитывается отдельной задачей rebuild_daily_stats_range.
+    """
+    chunks = [
+        rebuild_daily_stats_range.s(start.isoformat(), end.isoformat())
+        for start, end in iter_date_ranges(
+            date.fromisoformat(date_from), date.fromisoformat(date_to),
+            chunk_days
         )
+    ]
+    group(chunks).apply_async()
+    logger.info(
+        'Пересчет статистики за %s - %s разбит на %s задач(и).',
+        date_from, date_to, len(chunks)
+    )
+    return f'Поставлено задач пересчета статистики: {len(chunks)}.'
+
 
-        active_users_count = User.objects.filter(
-            orders__created_at__range=(yesterday_start, yesterday_end)
-        ).distinct().count()
+@shared_task
+def refresh_daily_stats():
+    """Метод пересчета статистики дней, затронутых загрузками."""
+    days = rebuild_dirty_daily_stats()
+    logger.info('Пересчитана статистика затронутых дней: %s.', days)
+    return f'Пересчитана статистика затронутых дней: {days}.'
+
+
+@shared_task
+def reconcile_user_stats():
+    """Метод сверки статистики пользователей с заказами.
+
+    Исправляет расхождения, которые не прошли через загрузку
+    (например, изменения заказов вне API), командой rebuild_user_stats.
+    """
+    output = io.StringIO()
+    call_command('rebuild_user_stats', stdout=output)
+    result = ' '.join(output.getvalue().split())
+    logger.info('Сверка статистики пользователей: %s', result)
+    return result
+
+
+def fail_stale_upload_jobs(jobs):
+    """Функция завершения зависших задач загрузки с ошибкой.
+
+    Задача считается зависшей, если выполняется дольше жесткого
+    лимита времени: воркер, который ее обрабатывал, остановлен
+    или задача прервана. Возвращает количество таких задач.
+    """
+    deadline = timezone.now() - timedelta(
+        seconds=settings.ORDERS_UPLOAD_JOB_TIMEOUT + 60
+    )
+    failed = jobs.filter(
+        status=UploadJob.Status.RUNNING, started_at__lt=deadline
+    ).update(
+        status=UploadJob.Status.FAILED,
+        errors={'non_field_errors': [
+            'Задача загрузки не завершилась за отведенное время.'
+        ]},
+        payload=None,
+        finished_at=timezone.now()
+    )
+    if failed:
+        logger.warning('Завершено с ошибкой зависших задач загрузки: %s.',
+                       failed)
+    return failed
 
-        daily_stats = DailyOrderStats.objects.create(
-            date=stats_date,
-            total_users=active_users_count,
-            total_orders=orders_stats['total_orders'] or 0,
-            total_revenue=orders_stats['total_revenue'] or 0,
-            avg_order_value=orders_stats['avg_order_value'] or 0
+
+@shared_task
+def expire_upload_jobs():
+    """Метод завершения зависших задач загрузки с ошибкой."""
+    failed = fail_stale_upload_jobs(UploadJob.objects.all())
+    return f'Завершено с ошибкой зависших задач загрузки: {failed}.'
+
+
+@shared_task(soft_time_limit=settings.ORDERS_UPLOAD_JOB_TIMEOUT,
+             time_limit=settings.ORDERS_UPLOAD_JOB_TIMEOUT + 60)
+def process_upload_job(job_id):
+    """Метод асинхронной записи заказов из задачи загрузки."""
+
+    logger.info('Начало обработки задачи загрузки %s.', job_id)
+
+    # Задача захватывается одним UPDATE: при повторной доставке или
+    # двойной постановке в очередь заказы запишет только один воркер.
+    claimed = UploadJob.objects.filter(
+        pk=job_id, status=UploadJob.Status.PENDING
+    ).update(status=UploadJob.Status.RUNNING, started_at=timezone.now())
+    if not claimed:
+        logger.warning(
+            'Задача загрузки %s не найдена или уже обработана.', job_id
         )
+        return f'Задача загрузки {job_id} не найдена или уже обработана.'
 
-        logger.info(
-            f'Ежедневная статистика создана за {stats_date}: '
-            f'{daily_stats.total_orders} заказов, '
-            f'{daily_stats.total_users} пользователей, '
-            f'общая выручка: {daily_stats.total_revenue:.2f}.'
+    jobs = UploadJob.objects.filter(pk=job_id)
+    payload = jobs.values_list('payload', flat=True).get()
+
+    serializer = OrderUploadSerializer(data=payload)
+    if not serializer.is_valid():
+        logger.warning(
+            'Ошибки валидации в задаче загрузки %s: %s.',
+            job_id, Truncated(serializer.errors)
         )
+        jobs.update(status=UploadJob.Status.FAILED,
+                    errors=serializer.errors,
+                    payload=None,
+                    finished_at=timezone.now())
+        return f'Задача загрузки {job_id} не прошла валидацию.'
 
-        return f'Статистика за {stats_date} успешно создана.'
+    jobs.update(total_orders=len(serializer.validated_data['orders']))
 
-    except Exception as e:
-        logger.error(
-            f'Ошибка при расчете статистики за {stats_date}: {str(e)}.'
+    try:
+        result = serializer.save(
+            progress_callback=lambda processed: jobs.update(
+                processed_orders=processed
+            )
         )
+    except Exception as e:
+        logger.error('Ошибка при обработке задачи загрузки %s: %s.', job_id, e)
+        jobs.update(status=UploadJob.Status.FAILED,
+                    errors={'non_field_errors': [str(e)]},
+                    finished_at=timezone.now())
         raise
+
+    statistics = {
+        'created_orders': result['created_orders'],
+        'updated_orders': result['updated_orders'],
+        'unchanged_orders': result['unchanged_orders'],
+        'created_items': result['created_items'],
+    }
+    jobs.update(status=UploadJob.Status.DONE,
+                statistics=statistics,
+                payload=None,
+                finished_at=timezone.now())
+
+    logger.info('Задача загрузки %s завершена: %s.', job_id, statistics)
+
+    return f'Задача загрузки {job_id} успешно завершена.'
@@ -0,0 +1,220 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (DailyOrderStats, Order, OrderItem, User,
+                     UserOrderStats)
+from .stats import compute_daily_stats
+
+
+class AdminQueriesTest(TestCase):
+    """Количество запросов страниц админки заказов.
+
+    Число запросов не должно зависеть от количества строк на странице:
+    каждая страница проверяется до и после добавления заказов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.order = cls.create_orders('first', 3)[0]
+
+    @staticmethod
+    def create_orders(prefix, count):
+        """Метод создания пользователей с заказами по два товара."""
+        orders = []
+        for index in range(count):
+            user = User.objects.create(username=f'{prefix}-user-{index}')
+            order = Order.objects.create(
+                user=user,
+                order_number=f'{prefix}-order-{index}',
+                created_at=timezone.now() - timedelta(days=index),
+                total_amount=Decimal('30.00'),
+                status='new'
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, sku=f'sku-{item}', name='Товар',
+                          quantity=1, price=Decimal('15.00'))
+                for item in range(2)
+            )
+            orders.append(order)
+        return orders
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assert_page_queries(self, url, count):
+        """Метод проверки числа запросов страницы до и после роста данных."""
+        for prefix in ('', 'more'):
+            if prefix:
+                self.create_orders(prefix, 20)
+            # Кэш типов содержимого сбрасывается, чтобы число запросов
+            # не зависело от предыдущих запросов.
+            ContentType.objects.clear_cache()
+            with self.assertNumQueries(count):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_order_changelist_queries(self):
+        self.assert_page_queries(
+            reverse('admin:orders_order_changelist'), 8
+        )
+
+    def test_order_item_changelist_queries(self):
+        self.assert_page_queries(
+            reverse('admin:orders_orderitem_changelist'), 4
+        )
+
+    def test_user_changelist_queries(self):
+        self.assert_page_queries(
+            reverse('admin:orders_user_changelist'), 4
+        )
+
+    def test_order_change_page_queries(self):
+        self.assert_page_queries(
+            reverse('admin:orders_order_change', args=(self.order.pk,)), 9
+        )
+
+    def test_order_status_filter_without_rollups(self):
+        response = self.client.get(reverse('admin:orders_order_changelist'))
+        self.assertContains(response, '?status=new')
+
+
+class UploadStatsTest(TransactionTestCase):
+    """Агрегаты статистики после загрузок через API.
+
+    Загрузка выполняется в настоящих транзакциях (on_commit), после
+    каждой загрузки UserOrderStats и DailyOrderStats сверяются
+    с агрегатом по заказам.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def order_data(number, created_at, amount, items=2):
+        """Метод формирования заказа для загрузки."""
+        return {
+            'order_number': number,
+            'created_at': created_at,
+            'total_amount': amount,
+            'status': 'new',
+            'items': [
+                {'sku': f'sku-{item}', 'name': 'Товар', 'quantity': 1,
+                 'price': '5.00'}
+                for item in range(items)
+            ]
+        }
+
+    def upload(self, username, orders):
+        """Метод загрузки заказов пользователя, возвращает статистику."""
+        response = self.client.post(
+            reverse('order-upload-stats-upload-orders'),
+            {'user': username, 'orders': orders},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['statistics']
+
+    def assert_stats_match_orders(self):
+        """Метод сверки статистики с агрегатом по заказам."""
+        expected = {
+            row['user_id']: (row['orders_count'], row['total_revenue'])
+            for row in Order.objects.values('user_id').annotate(
+                orders_count=Count('id'), total_revenue=Sum('total_amount')
+            ).order_by()
+        }
+        actual = {
+            stats.user_id: (stats.orders_count, stats.total_revenue)
+            for stats in UserOrderStats.objects.all()
+            if stats.orders_count or stats.total_revenue
+        }
+        self.assertEqual(actual, expected)
+
+        dates = [
+            timezone.localdate(created_at)
+            for created_at in Order.objects.values_list(
+                'created_at', flat=True
+            )
+        ]
+        stored = {
+            stats.date: stats for stats in DailyOrderStats.objects.all()
+        }
+        date_from = min([*dates, *stored], default=None)
+        date_to = max([*dates, *stored], default=None)
+        if date_from is None:
+            return
+        for expected_stats in compute_daily_stats(date_from, date_to):
+            stats = stored.get(expected_stats.date, DailyOrderStats())
+            for field in ('total_users', 'total_orders', 'total_revenue'):
+                self.assertEqual(
+                    getattr(stats, field), getattr(expected_stats, field),
+                    f'{expected_stats.date}: {field}'
+                )
+
+    def test_upload_and_reupload(self):
+        orders = [
+            self.order_data('A-1', '2025-11-12T10:00:00Z', '10.00'),
+            self.order_data('A-2', '2025-11-12T11:00:00Z', '20.00'),
+            self.order_data('A-3', '2025-11-13T10:00:00Z', '30.00'),
+        ]
+        self.assertEqual(self.upload('seller', orders)['created_orders'], 3)
+        self.assert_stats_match_orders()
+
+        statistics = self.upload('seller', orders)
+        self.assertEqual(statistics['unchanged_orders'], 3)
+        self.assert_stats_match_orders()
+
+        orders[0]['total_amount'] = '15.00'
+        statistics = self.upload('seller', orders)
+        self.assertEqual(statistics['updated_orders'], 1)
+        self.assert_stats_match_orders()
+
+    def test_move_order_to_another_user(self):
+        orders = [
+            self.order_data('B-1', '2025-11-12T10:00:00Z', '10.00'),
+            self.order_data('B-2', '2025-11-12T11:00:00Z', '20.00'),
+        ]
+        self.upload('first', orders)
+        self.upload('second', [
+            self.order_data('C-1', '2025-11-12T12:00:00Z', '5.00')
+        ])
+        self.assert_stats_match_orders()
+
+        self.upload('second', orders[:1])
+        self.assertEqual(
+            Order.objects.get(order_number='B-1').user.username, 'second'
+        )
+        self.assert_stats_match_orders()
+
+    def test_move_order_to_another_day(self):
+        orders = [
+            self.order_data('D-1', '2025-11-12T10:00:00Z', '10.00'),
+            self.order_data('D-2', '2025-11-12T11:00:00Z', '20.00'),
+        ]
+        self.upload('seller', orders)
+        self.assert_stats_match_orders()
+
+        orders[1]['created_at'] = '2025-11-14T11:00:00Z'
+        self.upload('seller', orders)
+        self.assert_stats_match_orders()
+
+        self.upload('buyer', [
+            dict(orders[0], created_at='2025-11-15T10:00:00Z')
+        ])
+        self.assert_stats_match_orders()
+
+
+@override_settings(ORDERS_UPLOAD_STRATEGY='upsert',
+                   ORDERS_UPLOAD_TRANSACTION='chunk')
+class UpsertUploadStatsTest(UploadStatsTest):
+    """Агрегаты статистики при стратегии upsert и транзакциях пачек."""
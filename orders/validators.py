@@ -0,0 +1,312 @@
+import decimal
+import re
+from collections.abc import Mapping
+from functools import cached_property
+
+from django.core.validators import (MaxLengthValidator, MaxValueValidator,
+                                    MinLengthValidator, MinValueValidator,
+                                    ProhibitNullCharactersValidator)
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+from rest_framework.settings import api_settings
+from rest_framework.validators import ProhibitSurrogateCharactersValidator
+
+PROHIBITED_CHARACTERS = re.compile('[\x00\ud800-\udfff]')
+
+CHAR_VALIDATORS = (MaxLengthValidator, MinLengthValidator,
+                   ProhibitNullCharactersValidator,
+                   ProhibitSurrogateCharactersValidator)
+INTEGER_VALIDATORS = (MinValueValidator, MaxValueValidator)
+
+
+class FieldChecker:
+    """Скомпилированная проверка одного поля сериализатора.
+
+    Типичные корректные значения проверяются быстрым путем без машинерии
+    DRF. Все остальное (отсутствующие, пустые, некорректные значения)
+    уходит в run_validation исходного поля, поэтому результат и тексты
+    ошибок совпадают с сериализатором.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.fast_check = self.compile(field)
+
+    def __call__(self, data):
+        """Метод проверки значения поля."""
+        if data is not empty and data is not None and data != '':
+            value = self.fast_check(data)
+            if value is not empty:
+                return value
+        return self.field.run_validation(data)
+
+    def compile(self, field):
+        """Метод выбора быстрой проверки по типу поля."""
+        if isinstance(field, serializers.CharField) and all(
+            isinstance(validator, CHAR_VALIDATORS)
+            for validator in field.validators
+        ):
+            return self.compile_char(field)
+        if isinstance(field, serializers.IntegerField) and all(
+            isinstance(validator, INTEGER_VALIDATORS)
+            for validator in field.validators
+        ):
+            return self.compile_integer(field)
+        if (isinstance(field, serializers.DecimalField)
+                and field.decimal_places is not None
+                and not field.localize and not field.validators):
+            return self.compile_decimal(field)
+        if isinstance(field, (serializers.DecimalField,
+                              serializers.DateTimeField)):
+            return self.compile_to_internal_value(field)
+        return lambda data: empty
+
+    @staticmethod
+    def compile_char(field):
+        """Метод сборки проверки строкового поля."""
+        max_length = field.max_length
+        min_length = field.min_length or 1
+        trim_whitespace = field.trim_whitespace
+
+        def check(data):
+            if type(data) is not str:
+                return empty
+            value = data.strip() if trim_whitespace else data
+            if (len(value) < min_length
+                    or (max_length is not None and len(value) > max_length)
+                    or PROHIBITED_CHARACTERS.search(value)):
+                return empty
+            return value
+
+        return check
+
+    @staticmethod
+    def compile_integer(field):
+        """Метод сборки проверки целочисленного поля."""
+        min_value = field.min_value
+        max_value = field.max_value
+
+        def check(data):
+            if (type(data) is not int
+                    or (min_value is not None and data < min_value)
+                    or (max_value is not None and data > max_value)):
+                return empty
+            return data
+
+        return check
+
+    @staticmethod
+    def compile_decimal(field):
+        """Метод сборки проверки десятичного поля.
+
+        Повторяет DecimalField.to_internal_value и validate_precision,
+        но с заранее вычисленными квантом и контекстом округления.
+        """
+        max_digits = field.max_digits
+        decimal_places = field.decimal_places
+        max_whole_digits = field.max_whole_digits
+        quantum = decimal.Decimal('.1') ** decimal_places
+        context = decimal.getcontext().copy()
+        if max_digits is not None:
+            context.prec = max_digits
+        rounding = field.rounding
+
+        def check(data):
+            if type(data) not in (str, int, float):
+                return empty
+            try:
+                value = decimal.Decimal(str(data).strip())
+            except decimal.DecimalException:
+                return empty
+            if not value.is_finite():
+                return empty
+            _, digits, exponent = value.as_tuple()
+            if exponent >= 0:
+                total_digits = whole_digits = len(digits) + exponent
+                places = 0
+            elif len(digits) > -exponent:
+                total_digits = len(digits)
+                whole_digits = total_digits + exponent
+                places = -exponent
+            else:
+                total_digits = places = -exponent
+                whole_digits = 0
+            if ((max_digits is not None and total_digits > max_digits)
+                    or places > decimal_places
+                    or (max_whole_digits is not None
+                        and whole_digits > max_whole_digits)):
+                return empty
+            return value.quantize(quantum, rounding=rounding, context=context)
+
+        return check
+
+    @staticmethod
+    def compile_to_internal_value(field):
+        """Метод сборки проверки через to_internal_value поля."""
+        to_internal_value = field.to_internal_value
+        run_validators = field.run_validators if field.validators else None
+
+        def check(data):
+            value = to_internal_value(data)
+            if run_validators is not None:
+                run_validators(value)
+            return value
+
+        return check
+
+
+class OrderPayloadValidator:
+    """Быстрый валидатор загрузки заказов.
+
+    Проверяет те же ограничения, что OrderUploadSerializer с вложенными
+    OrderSerializer и OrderItemSerializer, и возвращает ошибки той же
+    структуры, но без построения дерева сериализаторов на каждый запрос:
+    проверки полей собираются один раз из полей сериализаторов.
+    """
+
+    def __init__(self, order_serializer_class, user_serializer_class):
+        self.order_serializer_class = order_serializer_class
+        self.user_serializer_class = user_serializer_class
+
+    @cached_property
+    def checkers(self):
+        """Скомпилированные проверки полей (собираются при первом вызове)."""
+        order_serializer = self.order_serializer_class()
+        items_serializer = order_serializer.fields['items']
+        return {
+            'user': FieldChecker(
+                self.user_serializer_class().fields['user']
+            ),
+            'order': self.compile_fields(order_serializer, exclude='items'),
+            'item': self.compile_fields(items_serializer.child),
+            'order_messages': order_serializer.error_messages,
+            'item_messages': items_serializer.child.error_messages,
+            'list_messages': items_serializer.error_messages,
+        }
+
+    @staticmethod
+    def compile_fields(serializer, exclude=None):
+        """Метод сборки проверок записываемых полей сериализатора."""
+        return tuple(
+            (field.field_name, FieldChecker(field))
+            for field in serializer._writable_fields
+            if field.field_name != exclude
+        )
+
+    @staticmethod
+    def not_a_dict(messages, data):
+        """Метод формирования ошибки для данных, не являющихся словарем."""
+        return {api_settings.NON_FIELD_ERRORS_KEY: [
+            messages['invalid'].format(datatype=type(data).__name__)
+        ]}
+
+    @staticmethod
+    def run_checkers(checkers, data, validated, errors):
+        """Метод проверки полей словаря."""
+        for name, checker in checkers:
+            try:
+                validated[name] = checker(data.get(name, empty))
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+            except SkipField:
+                pass
+
+    def validate_item(self, data):
+        """Метод проверки товара заказа.
+
+        Возвращает кортеж (данные, ошибки), ошибки - None, если их нет.
+        """
+        checkers = self.checkers
+        if data is None:
+            return None, [checkers['item_messages']['null']]
+        if not isinstance(data, Mapping):
+            return None, self.not_a_dict(checkers['item_messages'], data)
+        validated, errors = {}, {}
+        self.run_checkers(checkers['item'], data, validated, errors)
+        return (None, errors) if errors else (validated, None)
+
+    def validate_order(self, data):
+        """Метод проверки заказа с товарами.
+
+        Возвращает кортеж (данные, ошибки), ошибки - None, если их нет.
+        """
+        checkers = self.checkers
+        if data is None:
+            return None, [checkers['order_messages']['null']]
+        if not isinstance(data, Mapping):
+            return None, self.not_a_dict(checkers['order_messages'], data)
+        validated, errors = {}, {}
+        self.run_checkers(checkers['order'], data, validated, errors)
+
+        items_data = data.get('items', empty)
+        if items_data is empty or items_data is None:
+            errors['items'] = [checkers['list_messages'][
+                'required' if items_data is empty else 'null'
+            ]]
+        elif not isinstance(items_data, list):
+            errors['items'] = {api_settings.NON_FIELD_ERRORS_KEY: [
+                checkers['list_messages']['not_a_list'].format(
+                    input_type=type(items_data).__name__
+                )
+            ]}
+        else:
+            items, items_errors = [], []
+            for item_data in items_data:
+                item, item_errors = self.validate_item(item_data)
+                items.append(item)
+                items_errors.append(item_errors or {})
+            if any(items_errors):
+                errors['items'] = items_errors
+            validated['items'] = items
+
+        return (None, errors) if errors else (validated, None)
+
+    def validate_upload(self, data, serializer):
+        """Метод проверки всей загрузки.
+
+        Хуки validate_user и validate_orders берутся у переданного
+        экземпляра OrderUploadSerializer. Возвращает провалидированные
+        данные или вызывает ValidationError.
+        """
+        checkers = self.checkers
+        if not isinstance(data, Mapping):
+            raise serializers.ValidationError(
+                self.not_a_dict(serializer.error_messages, data)
+            )
+
+        validated, errors = {}, {}
+        try:
+            validated['user'] = serializer.validate_user(
+                checkers['user'](data.get('user', empty))
+            )
+        except serializers.ValidationError as exc:
+            errors['user'] = exc.detail
+
+        orders_data = data.get('orders', empty)
+        if orders_data is empty or orders_data is None:
+            errors['orders'] = [checkers['list_messages'][
+                'required' if orders_data is empty else 'null'
+            ]]
+        elif not isinstance(orders_data, list):
+            errors['orders'] = {api_settings.NON_FIELD_ERRORS_KEY: [
+                checkers['list_messages']['not_a_list'].format(
+                    input_type=type(orders_data).__name__
+                )
+            ]}
+        else:
+            orders, orders_errors = [], []
+            for order_data in orders_data:
+                order, order_errors = self.validate_order(order_data)
+                orders.append(order)
+                orders_errors.append(order_errors or {})
+            if any(orders_errors):
+                errors['orders'] = orders_errors
+            else:
+                try:
+                    validated['orders'] = serializer.validate_orders(orders)
+                except serializers.ValidationError as exc:
+                    errors['orders'] = exc.detail
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return validated
@@ -1,26 +1,152 @@
+import hashlib
 import logging
+from calendar import timegm
+from datetime import datetime, time, timedelta
 from typing import Any, Dict
 
-from django.db.models import Avg, Count, Sum
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (extend_schema, extend_schema_view,
                                    OpenApiParameter)
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.viewsets import ViewSet
+from rest_framework.reverse import reverse
+from rest_framework.viewsets import ReadOnlyModelViewSet, ViewSet
 
-from .models import DailyOrderStats, Order, User
-from .serializers import (DailyStatsSerializer, OrderUploadSerializer,
-                          UserStatsSerializer)
+from .cache import get_user_stats, get_user_stats_counters, set_user_stats
+from .export import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, export_orders
+from .filters import OrderFilter
+from .log import Truncated
+from .metrics import METRICS_CONTENT_TYPE, registry
+from .models import (DailyOrderStats, Order, RollupGrain, UploadJob, User,
+                     UserOrderStats)
+from .pagination import DailyStatsPagination, OrderKeysetPagination
+from .parsers import NDJSONParser
+from .rollups import get_order_series
+from .serializers import (DailyStatsQuerySerializer, DailyStatsSerializer,
+                          OrderDetailSerializer, OrderSeriesPointSerializer,
+                          OrderSeriesQuerySerializer, OrderStreamValidator,
+                          OrderUploadSerializer, UploadJobSerializer,
+                          UploadUserSerializer,
+                          UserStatsBulkResponseSerializer,
+                          UserStatsBulkSerializer, UserStatsSerializer)
+from .services import OrderUploadService
+from .stats import get_users_stats
+from .tasks import fail_stale_upload_jobs, process_upload_job
 
 logger = logging.getLogger('orders')
 
+# Версия выборки ежедневной статистики: любое изменение или добавление
+# строки меняет максимальную дату изменения или количество строк.
+DAILY_STATS_VERSION = {
+    'last_modified': Max('updated_at'),
+    'count': Count('id'),
+}
+
+
+def get_daily_stats_version(version):
+    """Функция получения ETag и Last-Modified выборки статистики.
+
+    version - результат агрегации DAILY_STATS_VERSION.
+    """
+    last_modified = version['last_modified'] and timegm(
+        version['last_modified'].utctimetuple()
+    )
+    etag = quote_etag(hashlib.md5(
+        f'{version["last_modified"]}:{version["count"]}'.encode()
+    ).hexdigest())
+    return etag, last_modified
+
 
 @extend_schema(tags=['Orders'])
 @extend_schema_view(
     upload_orders=extend_schema(
         summary='Загрузка заказов',
-        description='Загрузка и обновление заказов пользователя',
+        description=(
+            'Загрузка и обновление заказов пользователя. С параметром '
+            'async=true данные сохраняются и записываются в фоне задачей '
+            'Celery, в ответ (202) возвращается идентификатор задачи.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                'async', bool, OpenApiParameter.QUERY,
+                description='Асинхронная загрузка через Celery'
+            )
+        ],
+        auth=[]
+    ),
+    upload_job_status=extend_schema(
+        summary='Статус асинхронной загрузки',
+        description='Прогресс, итоговая статистика и ошибки задачи '
+                    'асинхронной загрузки заказов',
+        parameters=[
+            OpenApiParameter(
+                'job_id', OpenApiTypes.UUID, OpenApiParameter.PATH,
+                description='Идентификатор задачи загрузки'
+            )
+        ],
+        responses=UploadJobSerializer,
+        auth=[]
+    ),
+    upload_orders_stream=extend_schema(
+        summary='Потоковая загрузка заказов',
+        description=(
+            'Загрузка заказов пользователя в формате NDJSON '
+            '(один заказ на строку). Заказы валидируются и записываются '
+            'пачками по мере чтения тела запроса, ошибки отдельных строк '
+            'возвращаются в ответе и не прерывают загрузку.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                'user', str, OpenApiParameter.QUERY,
+                description='Имя пользователя, для которого загружаются '
+                            'заказы',
+                required=True
+            )
+        ],
+        request={NDJSONParser.media_type: OpenApiTypes.STR},
+        auth=[]
+    ),
+    user_stats_cache=extend_schema(
+        summary='Счетчики кэша статистики',
+        description='Количество попаданий и промахов кэша статистики '
+                    'заказов пользователей',
+        responses=OpenApiTypes.OBJECT,
+        auth=[]
+    ),
+    users_stats=extend_schema(
+        summary='Статистика заказов нескольких пользователей',
+        description=(
+            'Статистика по списку пользователей одним запросом к БД. '
+            'GET принимает повторяющийся параметр user, POST - тело '
+            'с полем users. С date_from/date_to статистика считается '
+            'по заказам за период (даты включительно). Неизвестные '
+            'пользователи возвращаются в unknown_users.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                'user', str, OpenApiParameter.QUERY, many=True,
+                description='Имя пользователя (GET, можно повторять)'
+            ),
+            OpenApiParameter(
+                'date_from', OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                description='Начало периода (GET)'
+            ),
+            OpenApiParameter(
+                'date_to', OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                description='Конец периода включительно (GET)'
+            )
+        ],
+        request=UserStatsBulkSerializer,
+        responses=UserStatsBulkResponseSerializer,
         auth=[]
     ),
     user_stats=extend_schema(
@@ -45,9 +171,11 @@ class OrderUploadStatsViewSet(ViewSet):
     def upload_orders(self, request):
         """Метод для загрузки данных о заказах."""
         logger.info(
-            f'Получен POST запрос на /api/orders/upload от {request.user}.'
+            'Получен POST запрос на /api/orders/upload от %s.', request.user
         )
-        logger.debug(f'Данные запроса: {request.data}')
+        logger.debug('Данные запроса: %s', Truncated(request.data))
+        if request.query_params.get('async', '').lower() in ('1', 'true'):
+            return self.enqueue_upload(request)
         serializer = OrderUploadSerializer(data=request.data)
         if serializer.is_valid():
             result: Dict[str, Any] = serializer.save()  # type: ignore
@@ -57,19 +185,97 @@ class OrderUploadStatsViewSet(ViewSet):
                  'statistics': {
                      'created_orders': result['created_orders'],
                      'updated_orders': result['updated_orders'],
+                     'unchanged_orders': result['unchanged_orders'],
                      'created_items': result['created_items'],
                  }},
                 status=status.HTTP_201_CREATED
             )
-        logger.warning(f'Ошибки валидации: {serializer.errors}.')
+        logger.warning('Ошибки валидации: %s.', Truncated(serializer.errors))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def enqueue_upload(self, request):
+        """Метод постановки загрузки заказов в очередь Celery."""
+        job = UploadJob.objects.create(payload=request.data)
+        transaction.on_commit(lambda: process_upload_job.delay(str(job.id)))
+        logger.info('Загрузка поставлена в очередь, задача %s.', job.id)
+        return Response(
+            {'message': 'Заказ(ы) приняты в обработку.',
+             'job_id': job.id,
+             'status_url': reverse(
+                 'order-upload-stats-upload-job-status',
+                 kwargs={'job_id': job.id},
+                 request=request
+             )},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(detail=False, methods=('get',),
+            url_path=r'upload/(?P<job_id>[0-9a-f-]{36})')
+    def upload_job_status(self, request, job_id):
+        """Метод для получения статуса асинхронной загрузки."""
+        jobs = UploadJob.objects.filter(pk=job_id)
+        fail_stale_upload_jobs(jobs)
+        job = jobs.first()
+        if job is None:
+            logger.warning('Задача загрузки не найдена: %s.', job_id)
+            return Response(
+                {'error': f'Задача загрузки {job_id} не найдена.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(UploadJobSerializer(job).data)
+
+    @action(detail=False, methods=('post',), url_path='upload-stream',
+            parser_classes=(NDJSONParser,))
+    def upload_orders_stream(self, request):
+        """Метод для потоковой загрузки заказов в формате NDJSON."""
+        logger.info(
+            'Получен POST запрос на /api/orders/upload-stream от %s.',
+            request.user
+        )
+        user_serializer = UploadUserSerializer(data=request.query_params)
+        if not user_serializer.is_valid():
+            logger.warning('Ошибки валидации: %s.', user_serializer.errors)
+            return Response(user_serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        validator = OrderStreamValidator(
+            settings.ORDERS_UPLOAD_STREAM_MAX_ERRORS
+        )
+        service = OrderUploadService(user_serializer.validated_data['user'])
+        result = service.upload(validator(request.data))
+
+        statistics = {
+            'created_orders': result['created_orders'],
+            'updated_orders': result['updated_orders'],
+            'unchanged_orders': result['unchanged_orders'],
+            'created_items': result['created_items'],
+            'invalid_lines': validator.invalid_lines,
+        }
+        if not validator.order_numbers:
+            logger.warning('В потоковой загрузке нет валидных заказов.')
+            return Response(
+                {'message': 'Нет валидных заказов для загрузки.',
+                 'statistics': statistics,
+                 'errors': validator.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        logger.info('Потоковая загрузка завершена: %s.', statistics)
+        return Response(
+            {'message': 'Заказ(ы) успешно загружены/обновлены.',
+             'statistics': statistics,
+             'errors': validator.errors},
+            status=status.HTTP_201_CREATED
+        )
+
     @action(detail=False, methods=('get',), url_path='stats')
     def user_stats(self, request):
         """Метод для создания статистики по пользователю."""
         username = request.query_params.get('user', '').strip()
 
-        logger.info(f'Получен запрос статистики для пользователя: {username}.')
+        logger.info(
+            'Получен запрос статистики для пользователя: %s.', username
+        )
 
         if not username:
             logger.warning('Запрос статистики без параметра user.')
@@ -79,46 +285,305 @@ class OrderUploadStatsViewSet(ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
-            logger.warning(f'Пользователь не найден: {username}.')
-            return Response(
-                {'error': f'Пользователь {username} не найден.'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        stats_data, version = get_user_stats(username)
+        cache_status = 'HIT'
+        if stats_data is None:
+            cache_status = 'MISS'
+            user = User.objects.select_related('order_stats').filter(
+                username=username
+            ).first()
+            if user is None:
+                logger.warning('Пользователь не найден: %s.', username)
+                return Response(
+                    {'error': f'Пользователь {username} не найден.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
 
-        stats = Order.objects.filter(user=user).aggregate(
-            orders_count=Count('id'),
-            total_revenue=Sum('total_amount'),
-            avg_order_value=Avg('total_amount')
-        )
+            try:
+                stats = user.order_stats
+            except UserOrderStats.DoesNotExist:
+                stats = UserOrderStats(user=user)
 
-        stats_data = {
-            'user': username,
-            'orders_count': stats['orders_count'] or 0,
-            'total_revenue': stats['total_revenue'] or 0,
-            'avg_order_value': stats['avg_order_value'] or 0
-        }
+            stats_data = {
+                'user': username,
+                'orders_count': stats.orders_count,
+                'total_revenue': stats.total_revenue,
+                'avg_order_value': stats.avg_order_value
+            }
+            set_user_stats(username, version, stats_data)
 
         serializer = UserStatsSerializer(stats_data)
 
         logger.info(
-            f'Сделана статистика для {username}: '
-            f'{stats_data["orders_count"]} заказа(ов), '
-            f'общая выручка: {stats_data["total_revenue"]:.2f}, '
-            f'средний чек: {stats_data["avg_order_value"]:.2f}.'
+            'Сделана статистика для %s: %s заказа(ов), общая выручка: %.2f, '
+            'средний чек: %.2f, кэш: %s.',
+            username, stats_data['orders_count'], stats_data['total_revenue'],
+            stats_data['avg_order_value'], cache_status
         )
 
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'X-Cache': cache_status})
 
+    @action(detail=False, methods=('get', 'post'), url_path='stats/bulk')
+    def users_stats(self, request):
+        """Метод для получения статистики нескольких пользователей."""
+        if request.method == 'GET':
+            data = {'users': request.query_params.getlist('user')}
+            for param in ('date_from', 'date_to'):
+                if param in request.query_params:
+                    data[param] = request.query_params[param]
+        else:
+            data = request.data
+        serializer = UserStatsBulkSerializer(data=data)
+        if not serializer.is_valid():
+            logger.warning('Ошибки валидации: %s.', serializer.errors)
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
 
+        usernames = serializer.validated_data['users']
+        date_from = serializer.validated_data.get('date_from')
+        date_to = serializer.validated_data.get('date_to')
+        logger.info(
+            'Получен запрос статистики для %s пользователя(ей), '
+            'период: %s - %s.', len(usernames), date_from, date_to
+        )
+        stats, unknown_users = get_users_stats(
+            usernames,
+            created_from=self.start_of_day(date_from),
+            created_to=self.start_of_day(
+                date_to and date_to + timedelta(days=1)
+            )
+        )
+        if unknown_users:
+            logger.warning('Пользователи не найдены: %s.', len(unknown_users))
+        return Response(UserStatsBulkResponseSerializer(
+            {'stats': stats, 'unknown_users': unknown_users}
+        ).data)
+
+    @staticmethod
+    def start_of_day(day):
+        """Метод получения начала дня в текущем часовом поясе."""
+        if day is None:
+            return None
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @action(detail=False, methods=('get',), url_path='stats/cache')
+    def user_stats_cache(self, request):
+        """Метод для получения счетчиков кэша статистики."""
+        return Response(get_user_stats_counters())
+
+
+@extend_schema_view(
+    daily_stats=extend_schema(
+        summary='Ежедневная статистика',
+        description=(
+            'Ежедневная статистика заказов от новых дней к старым '
+            'с пагинацией курсором. Ответ содержит ETag и Last-Modified, '
+            'на условный запрос без изменений возвращается 304.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                'from', OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                description='Начало периода'
+            ),
+            OpenApiParameter(
+                'to', OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                description='Конец периода включительно'
+            )
+        ],
+        responses=DailyStatsSerializer(many=True),
+        auth=[]
+    ),
+    series=extend_schema(
+        summary='Временной ряд заказов',
+        description=(
+            'Количество заказов и выручка по часам или дням за период, '
+            'итогом или в разбивке по статусу либо пользователю. '
+            'Читается из предрасчитанных интервалов, которые '
+            'пересчитываются задачами Celery.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                'from', OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                description='Начало периода', required=True
+            ),
+            OpenApiParameter(
+                'to', OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                description='Конец периода включительно', required=True
+            ),
+            OpenApiParameter(
+                'grain', str, OpenApiParameter.QUERY,
+                enum=RollupGrain.values,
+                description='Гранулярность (по умолчанию day)'
+            ),
+            OpenApiParameter(
+                'group_by', str, OpenApiParameter.QUERY,
+                enum=('status', 'user'),
+                description='Разбивка интервалов'
+            )
+        ],
+        responses=OrderSeriesPointSerializer(many=True),
+        auth=[]
+    )
+)
 class DailyStatsViewSet(ViewSet):
     """ViewSet для просмотра ежедневной статистики."""
 
+    # Параметры запроса и соответствующие поля сериализаторов
+    # DailyStatsQuerySerializer и OrderSeriesQuerySerializer.
+    DAILY_STATS_PARAMS = {
+        'from': 'date_from',
+        'to': 'date_to',
+    }
+    SERIES_PARAMS = {
+        **DAILY_STATS_PARAMS,
+        'grain': 'grain',
+        'group_by': 'group_by',
+    }
+
+    @staticmethod
+    def get_query_data(request, params):
+        """Метод сопоставления параметров запроса полям сериализатора."""
+        return {
+            field: request.query_params[param]
+            for param, field in params.items()
+            if param in request.query_params
+        }
+
     @action(detail=False, methods=['get'])
     def daily_stats(self, request):
         """Метод для получение ежедневной статистики."""
-        stats = DailyOrderStats.objects.all().order_by('-date')[:30]
-        serializer = DailyStatsSerializer(stats, many=True)
-        return Response(serializer.data)
+        query_serializer = DailyStatsQuerySerializer(
+            data=self.get_query_data(request, self.DAILY_STATS_PARAMS)
+        )
+        if not query_serializer.is_valid():
+            logger.warning('Ошибки валидации: %s.', query_serializer.errors)
+            return Response(query_serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        stats = DailyOrderStats.objects.all()
+        if 'date_from' in query_serializer.validated_data:
+            stats = stats.filter(
+                date__gte=query_serializer.validated_data['date_from']
+            )
+        if 'date_to' in query_serializer.validated_data:
+            stats = stats.filter(
+                date__lte=query_serializer.validated_data['date_to']
+            )
+
+        etag, last_modified = get_daily_stats_version(
+            stats.aggregate(**DAILY_STATS_VERSION)
+        )
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+
+        paginator = DailyStatsPagination()
+        page = paginator.paginate_queryset(stats, request, view=self)
+        response = paginator.get_paginated_response(
+            DailyStatsSerializer(page, many=True).data
+        )
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    @action(detail=False, methods=('get',), url_path='series')
+    def series(self, request):
+        """Метод для получения временного ряда заказов."""
+        serializer = OrderSeriesQuerySerializer(
+            data=self.get_query_data(request, self.SERIES_PARAMS)
+        )
+        if not serializer.is_valid():
+            logger.warning('Ошибки валидации: %s.', serializer.errors)
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+        series = get_order_series(**serializer.validated_data)
+        return Response(OrderSeriesPointSerializer(series, many=True).data)
+
+
+@extend_schema(tags=['Orders'])
+@extend_schema_view(
+    list=extend_schema(
+        summary='Список заказов',
+        description=(
+            'Заказы с пользователем и товарами в порядке создания '
+            '(created_at, id), с фильтрами по пользователю, статусу '
+            'и периоду создания и пагинацией по ключу.'
+        ),
+        auth=[]
+    ),
+    retrieve=extend_schema(
+        summary='Заказ',
+        description='Заказ с пользователем и товарами',
+        auth=[]
+    ),
+    export=extend_schema(
+        summary='Выгрузка заказов',
+        description=(
+            'Потоковая выгрузка заказов с товарами (с фильтрами списка) '
+            'в CSV или Parquet (строка на товар) либо NDJSON '
+            '(строка на заказ).'
+        ),
+        parameters=[
+            OpenApiParameter(
+                'file_format', str, OpenApiParameter.QUERY,
+                enum=EXPORT_FORMATS,
+                description='Формат файла (по умолчанию csv)'
+            )
+        ],
+        responses={(200, content_type.split(';')[0]): OpenApiTypes.BINARY
+                   for content_type in EXPORT_CONTENT_TYPES.values()},
+        auth=[]
+    )
+)
+class OrderViewSet(ReadOnlyModelViewSet):
+    """ViewSet для просмотра заказов."""
+
+    queryset = Order.objects.select_related('user').prefetch_related(
+        'items'
+    )
+    serializer_class = OrderDetailSerializer
+    pagination_class = OrderKeysetPagination
+    # Сортировка задается пагинацией, поэтому OrderingFilter
+    # и SearchFilter из настроек по умолчанию не подключаются.
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = OrderFilter
+    # Маршруты действий OrderUploadStatsViewSet (upload, stats, ...)
+    # под тем же префиксом не должны совпадать с детальным.
+    lookup_value_regex = r'\d+'
+
+    @action(detail=False, methods=('get',), url_path='export',
+            pagination_class=None)
+    def export(self, request):
+        """Метод для потоковой выгрузки заказов в файл."""
+        # Параметр format занят DRF под выбор рендерера.
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'file_format': f'Допустимые форматы: '
+                                f'{", ".join(EXPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            content = export_orders(
+                self.filter_queryset(Order.objects.all()), export_format,
+                settings.ORDERS_EXPORT_CHUNK_SIZE
+            )
+        except ImportError as e:
+            return Response({'file_format': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        logger.info('Начата выгрузка заказов в %s.', export_format)
+        response = StreamingHttpResponse(
+            content, content_type=EXPORT_CONTENT_TYPES[export_format]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="orders.{export_format}"'
+        )
+        return response
+
+
+def metrics(request):
+    """Функция вывода метрик запросов к API в формате Prometheus."""
+    return HttpResponse(registry.render(), content_type=METRICS_CONTENT_TYPE)